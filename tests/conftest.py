@@ -0,0 +1,31 @@
+"""Shared fixtures for the wedding playlist tests."""
+
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test from an empty directory so the output/ caches never touch the real ones."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+class FakeClock:
+    """Stand-in for time.monotonic/time.time whose sleeps advance it instantly."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """A fresh fake clock starting at t=1000."""
+    return FakeClock()
@@ -0,0 +1,169 @@
+"""Tests for AI response parsing, request pacing and the AI score cache."""
+
+import asyncio
+
+import pytest
+
+from wedding_playlist import ai_validator
+from wedding_playlist.ai_validator import AIValidator, StreamingArrayParser, TokenBucket, parse_score_pair
+
+
+class TestStreamingArrayParser:
+
+    def test_elements_split_across_chunks(self):
+        parser = StreamingArrayParser()
+
+        assert parser.feed('[[8, "y"], [3') == [[8, "y"]]
+        assert parser.feed(', "n"]') == [[3, "n"]]
+        assert parser.feed(', [5, "m"]]') == [[5, "m"]]
+        assert parser.items == [[8, "y"], [3, "n"], [5, "m"]]
+
+    def test_brackets_inside_strings_are_ignored(self):
+        parser = StreamingArrayParser()
+
+        assert parser.feed('[[7, "y]"], [2, "\\"["]]') == [[7, "y]"], [2, '"[']]
+
+    def test_truncated_response_keeps_completed_elements(self):
+        parser = StreamingArrayParser()
+
+        parser.feed('```json\n[[9, "y"], [4, "n"], [6, "')
+
+        assert parser.items == [[9, "y"], [4, "n"]]
+
+
+class TestParseScorePair:
+
+    @pytest.mark.parametrize("item, expected", [
+        ([7, "y"], (7, "yes")),
+        (["8", "n"], (8, "no")),
+        ([12, "m"], (10, "maybe")),
+        ([0, "yes"], (1, "yes")),
+        ([6.6, "x"], (7, "maybe")),
+        ([5, ["y"]], (5, "maybe")),
+    ])
+    def test_valid_pairs_are_normalized(self, item, expected):
+        assert parse_score_pair(item) == expected
+
+    @pytest.mark.parametrize("item", [["high", "y"], [7], None, [True, "y"], [float("nan"), "y"], {"score": 7}])
+    def test_unusable_pairs_are_rejected(self, item):
+        assert parse_score_pair(item) is None
+
+
+class TestTokenBucket:
+
+    @pytest.fixture(autouse=True)
+    def fake_time(self, clock, monkeypatch):
+        monkeypatch.setattr(ai_validator.time, "monotonic", clock)
+        monkeypatch.setattr(ai_validator.asyncio, "sleep", clock.sleep)
+
+    def test_requests_wait_for_refill(self, clock):
+        bucket = TokenBucket(rpm=60, tpm=100_000)
+
+        async def spend(count: int):
+            for _ in range(count):
+                await bucket.acquire(10)
+
+        asyncio.run(spend(60))
+        assert clock.sleeps == []
+
+        # The 61st request needs one request's worth of refill: one second at 60 rpm
+        asyncio.run(spend(1))
+        assert sum(clock.sleeps) == pytest.approx(1.0)
+
+    def test_token_budget_limits_large_requests(self, clock):
+        bucket = TokenBucket(rpm=1000, tpm=600)
+
+        asyncio.run(bucket.acquire(600))
+        asyncio.run(bucket.acquire(300))
+
+        # 300 tokens at 600 per minute take 30 seconds to refill
+        assert sum(clock.sleeps) == pytest.approx(30.0)
+
+    def test_pause_holds_back_requests(self, clock):
+        bucket = TokenBucket(rpm=60, tpm=100_000)
+        bucket.pause(5)
+
+        asyncio.run(bucket.acquire(1))
+
+        assert sum(clock.sleeps) >= 5
+
+
+@pytest.fixture
+def validator(workdir, monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    return AIValidator()
+
+
+def make_track(name: str = "Party Anthem") -> dict:
+    return {'id': name.replace(' ', '').ljust(22, 'x'), 'name': name, 'artist': "DJ Test", 'popularity': 70}
+
+
+class TestParseAIResponse:
+
+    def test_short_array_defaults_trailing_tracks(self, validator):
+        tracks = [make_track("One"), make_track("Two")]
+
+        validator._parse_ai_response('[[8, "y"]]', tracks)
+
+        assert (tracks[0]['ai_party_score'], tracks[0]['ai_recommendation']) == (8, 'yes')
+        assert tracks[1]['ai_party_score'] == 5
+        assert tracks[1]['ai_reasoning'].startswith('Parsing error')
+
+    def test_invalid_entry_only_affects_its_track(self, validator):
+        tracks = [make_track("One"), make_track("Two")]
+
+        validator._parse_ai_response('[["loud", "y"], [3, "n"]]', tracks)
+
+        assert tracks[0]['ai_party_score'] == 5
+        assert tracks[0]['ai_reasoning'].startswith('Parsing error')
+        assert (tracks[1]['ai_party_score'], tracks[1]['ai_recommendation']) == (3, 'no')
+
+
+class TestScoreCache:
+
+    def test_cached_scores_round_trip_as_ints(self, validator):
+        track = make_track()
+        pending, keys, _ = validator._split_cached([track])
+        ai_validator.set_ai_result(track, 7, '', 'yes')
+        validator._store_cached_results(keys, [track])
+
+        cached_track = make_track()
+        pending, _, _ = validator._split_cached([cached_track])
+
+        assert pending == []
+        assert cached_track['ai_party_score'] == 7
+        assert isinstance(cached_track['ai_party_score'], int)
+
+    def test_parsing_errors_are_not_cached(self, validator):
+        track = make_track()
+        _, keys, _ = validator._split_cached([track])
+        ai_validator.set_ai_result(track, 5, 'Parsing error: bad JSON', 'maybe')
+        validator._store_cached_results(keys, [track])
+
+        pending, _, _ = validator._split_cached([make_track()])
+
+        assert len(pending) == 1
+
+    def test_use_cache_false_skips_cached_scores(self, validator):
+        track = make_track()
+        _, keys, _ = validator._split_cached([track])
+        ai_validator.set_ai_result(track, 9, '', 'yes')
+        validator._store_cached_results(keys, [track])
+
+        validator.use_cache = False
+        pending, _, _ = validator._split_cached([make_track()])
+
+        assert len(pending) == 1
+
+    def test_changed_features_miss_the_cache(self, validator):
+        track = make_track()
+        _, keys, _ = validator._split_cached([track])
+        ai_validator.set_ai_result(track, 9, '', 'yes')
+        validator._store_cached_results(keys, [track])
+
+        changed = make_track()
+        changed['popularity'] = 10
+        pending, _, descriptions = validator._split_cached([changed])
+
+        assert pending == [changed]
+        assert "Spotify popularity: 10/100" in descriptions[0]
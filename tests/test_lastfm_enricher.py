@@ -0,0 +1,140 @@
+"""Tests for Last.fm response extraction, error classification and the lookup cache."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from wedding_playlist import lastfm_enricher
+from wedding_playlist.lastfm_enricher import (
+    CACHE_TTL, NEGATIVE_CACHE_TTL, LastFMEnricher, LastFMError,
+    _is_transient, extract_artist_metadata, extract_track_metadata,
+)
+
+
+class TestExtractMetadata:
+
+    def test_track_fields(self):
+        track_info = {'track': {'playcount': '1200', 'listeners': '300', 'duration': '215000'}}
+        track_tags = {'toptags': {'tag': [{'name': 'Dance', 'count': '100'}, {'name': 'Pop', 'count': 40}]}}
+        similar = {'similartracks': {'track': {'name': 'Other', 'artist': {'name': 'Someone'}, 'match': '0.5'}}}
+
+        metadata = extract_track_metadata(track_info, track_tags, similar)
+
+        assert metadata['playcount'] == 1200
+        assert metadata['listeners'] == 300
+        assert metadata['duration_seconds'] == 215
+        assert metadata['tags'] == [{'name': 'dance', 'weight': 100}, {'name': 'pop', 'weight': 40}]
+        assert metadata['genres'] == ['Dance', 'Pop']
+        assert metadata['similar_tracks'] == [{'artist': 'Someone', 'track': 'Other', 'match': 0.5}]
+
+    def test_failed_lookups_leave_empty_fields(self):
+        metadata = extract_track_metadata(LastFMError("Track not found", 6), httpx.ReadTimeout("slow"), {})
+
+        assert metadata == {'tags': [], 'genres': [], 'similar_tracks': []}
+
+    def test_artist_fields(self):
+        artist_info = {'artist': {'stats': {'playcount': '50', 'listeners': '10'}}}
+        artist_tags = {'toptags': {'tag': [{'name': f'tag{i}'} for i in range(8)]}}
+
+        metadata = extract_artist_metadata(artist_info, artist_tags, {})
+
+        assert metadata['artist_info'] == {'playcount': 50, 'listeners': 10}
+        assert metadata['artist_tags'] == ['tag0', 'tag1', 'tag2', 'tag3', 'tag4']
+        assert metadata['similar_artists'] == []
+
+
+class TestIsTransient:
+
+    def test_not_found_is_definitive(self):
+        assert not _is_transient(LastFMError("Track not found", 6))
+
+    @pytest.mark.parametrize("code", [29, 8, 11, 16, 0])
+    def test_other_lastfm_errors_are_transient(self, code):
+        assert _is_transient(LastFMError("try again", code))
+
+    def test_network_errors_are_transient(self):
+        assert _is_transient(httpx.ConnectError("refused"))
+        assert _is_transient(ValueError("bad JSON"))
+
+    def test_responses_are_not_transient(self):
+        assert not _is_transient({'toptags': {}})
+        assert not _is_transient({})
+
+
+@pytest.fixture
+def enricher(workdir, monkeypatch):
+    monkeypatch.setenv("LASTFM_API_KEY", "test-key")
+    return LastFMEnricher()
+
+
+class TestLookupCache:
+
+    def test_entries_expire_after_their_ttl(self, enricher, clock, monkeypatch):
+        monkeypatch.setattr(lastfm_enricher.time, "time", clock)
+        key = enricher._cache_key("Artist", "Song")
+
+        enricher._store_cached(key, {'genres': ['pop']}, CACHE_TTL)
+        assert enricher._load_cached(key) == (True, {'genres': ['pop']})
+
+        clock.now += CACHE_TTL + 1
+        assert enricher._load_cached(key) == (False, None)
+
+    def test_known_misses_are_cached(self, enricher, clock, monkeypatch):
+        monkeypatch.setattr(lastfm_enricher.time, "time", clock)
+        key = enricher._cache_key("Artist", "Song")
+
+        enricher._store_cached(key, None, NEGATIVE_CACHE_TTL)
+        assert enricher._load_cached(key) == (True, None)
+
+        clock.now += NEGATIVE_CACHE_TTL + 1
+        assert enricher._load_cached(key) == (False, None)
+
+    def test_key_ignores_case_and_whitespace(self, enricher):
+        assert enricher._cache_key(" ARTIST ", "song") == enricher._cache_key("artist", "Song ")
+
+
+def run_lookup(enricher, responses):
+    """Run one track lookup against canned responses keyed by Last.fm method name."""
+    calls = []
+
+    async def fake_call(method, **params):
+        calls.append(method)
+        result = responses.get(method, {})
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def lookup():
+        enricher._call = fake_call
+        enricher._artist_bundles = {}
+        return await enricher._get_lastfm_metadata("Song", "Artist")
+
+    return asyncio.run(lookup()), calls
+
+
+class TestTrackProbe:
+
+    def test_not_found_short_circuits_and_is_cached(self, enricher):
+        metadata, calls = run_lookup(enricher, {'track.getInfo': LastFMError("Track not found", 6)})
+
+        assert metadata is None
+        assert calls == ['track.getInfo']
+        assert enricher._load_cached(enricher._cache_key("Artist", "Song")) == (True, None)
+
+    def test_rate_limit_falls_through_and_is_not_cached(self, enricher):
+        tags = {'toptags': {'tag': [{'name': 'Party', 'count': 5}]}}
+        metadata, calls = run_lookup(enricher, {
+            'track.getInfo': LastFMError("Rate limit exceeded", 29),
+            'track.getTopTags': tags,
+        })
+
+        assert metadata['genres'] == ['Party']
+        assert 'track.getTopTags' in calls and 'artist.getInfo' in calls
+        assert enricher._load_cached(enricher._cache_key("Artist", "Song")) == (False, None)
+
+    def test_complete_lookup_is_cached(self, enricher):
+        metadata, _ = run_lookup(enricher, {'track.getInfo': {'track': {'playcount': '7'}}})
+
+        assert metadata['playcount'] == 7
+        assert enricher._load_cached(enricher._cache_key("Artist", "Song")) == (True, metadata)
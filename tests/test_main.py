@@ -0,0 +1,74 @@
+"""Tests for seed-track fetching and deduplication in the CLI."""
+
+import asyncio
+from types import SimpleNamespace
+
+from wedding_playlist.main import _dedup_by_id, _fetch_seed_tracks
+
+
+def make_tracks(*ids):
+    return [{'id': track_id, 'name': f"Song {track_id}"} for track_id in ids]
+
+
+class FakeSpotify:
+    """Spotify client stand-in serving fixed top and saved tracks, recording requested limits."""
+
+    def __init__(self, top, saved):
+        self.top = top
+        self.saved = saved
+        self.calls = []
+        self.sp = SimpleNamespace(auth_manager=SimpleNamespace(get_access_token=self.get_access_token))
+
+    def get_access_token(self, as_dict=True):
+        self.calls.append(('token', None))
+        return "token"
+
+    def get_user_top_tracks(self, limit):
+        self.calls.append(('top', limit))
+        return self.top[:limit]
+
+    def get_saved_tracks(self, limit):
+        self.calls.append(('saved', limit))
+        return self.saved[:limit]
+
+
+class TestDedupById:
+
+    def test_keeps_first_occurrence_in_order(self):
+        tracks = make_tracks('a', 'b', 'a', 'c', 'b')
+
+        assert [t['id'] for t in _dedup_by_id(tracks, 10)] == ['a', 'b', 'c']
+
+    def test_skips_missing_ids_and_stops_at_limit(self):
+        tracks = [{'name': "Local file"}, {'id': None}] + make_tracks('a', 'b', 'c')
+
+        assert [t['id'] for t in _dedup_by_id(tracks, 2)] == ['a', 'b']
+
+
+class TestFetchSeedTracks:
+
+    def test_small_run_filled_by_top_tracks_skips_saved(self):
+        client = FakeSpotify(make_tracks('a', 'b', 'c'), make_tracks('x'))
+
+        top, saved = asyncio.run(_fetch_seed_tracks(client, 3))
+
+        assert [t['id'] for t in top] == ['a', 'b', 'c']
+        assert saved == []
+        assert client.calls == [('top', 3)]
+
+    def test_small_run_over_fetches_saved_by_possible_overlap(self):
+        # Two unique top tracks for a run of five: every saved track could repeat one of them
+        client = FakeSpotify(make_tracks('a', 'b'), make_tracks('a', 'b', 'c', 'd', 'e', 'f'))
+
+        top, saved = asyncio.run(_fetch_seed_tracks(client, 5))
+
+        assert client.calls == [('top', 5), ('saved', 5)]
+        assert len(_dedup_by_id(top + saved, 5)) == 5
+
+    def test_large_run_fetches_both_after_resolving_token(self):
+        client = FakeSpotify(make_tracks(*'abc'), make_tracks(*'xyz'))
+
+        asyncio.run(_fetch_seed_tracks(client, 200))
+
+        assert client.calls[0] == ('token', None)
+        assert sorted(client.calls[1:]) == [('saved', 50), ('top', 50)]
@@ -0,0 +1,174 @@
+"""Tests for the analyzer's name-energy and style scoring and its cluster cache."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wedding_playlist.music_analyzer import MusicAnalyzer
+
+
+def reference_energy(track_name: str) -> float:
+    """Per-name keyword scoring the vectorized estimate replaced."""
+    track_name = track_name.lower()
+    high_energy_keywords = ['dance', 'party', 'electric', 'beat', 'club', 'remix', 'uptempo', 'energy', 'pump', 'groove']
+    low_energy_keywords = ['ballad', 'acoustic', 'slow', 'quiet', 'piano', 'soft', 'gentle', 'lullaby', 'ambient']
+    energy_score = 0.5
+    for keyword in high_energy_keywords:
+        if keyword in track_name:
+            energy_score += 0.1
+    for keyword in low_energy_keywords:
+        if keyword in track_name:
+            energy_score -= 0.1
+    return max(0.0, min(1.0, energy_score))
+
+
+def reference_style(cluster_data: pd.DataFrame) -> str:
+    """Per-cluster style description the vectorized rules replaced."""
+    style_elements = []
+    avg_popularity = cluster_data['popularity'].mean() if 'popularity' in cluster_data.columns else 50
+    if avg_popularity > 70:
+        style_elements.append("Popular hits")
+    elif avg_popularity < 30:
+        style_elements.append("Deep cuts")
+    if 'release_year' in cluster_data.columns:
+        avg_year = cluster_data['release_year'].mean()
+        if avg_year < 1980:
+            style_elements.append("Classic oldies")
+        elif avg_year < 1990:
+            style_elements.append("80s")
+        elif avg_year < 2000:
+            style_elements.append("90s")
+        elif avg_year < 2010:
+            style_elements.append("2000s")
+        elif avg_year < 2020:
+            style_elements.append("2010s")
+        else:
+            style_elements.append("Recent releases")
+    if 'name_energy' in cluster_data.columns:
+        avg_energy = cluster_data['name_energy'].mean()
+        if avg_energy > 0.6:
+            style_elements.append("High-energy")
+        elif avg_energy < 0.4:
+            style_elements.append("Mellow")
+    if 'duration_ms' in cluster_data.columns:
+        avg_duration = cluster_data['duration_ms'].mean() / 1000
+        if avg_duration > 300:
+            style_elements.append("Extended tracks")
+        elif avg_duration < 180:
+            style_elements.append("Radio-friendly")
+    return " ".join(style_elements) if style_elements else "Mixed style"
+
+
+@pytest.fixture
+def analyzer(workdir):
+    return MusicAnalyzer()
+
+
+TRACK_NAMES = [
+    "Dance the Night", "PARTY ROCK ANTHEM", "Slow Dance", "Piano Man", "Acoustic Ballad (Soft Version)",
+    "Electric Feel - Club Remix", "Dance Dance Dance", "Uptempo Energy Pump Groove Beat Party",
+    "Quiet Gentle Lullaby Ambient Piano Soft Slow", "Yesterday", "", "Pumpiano", "Groovebeat",
+    "Ambient Acoustics", "Beatles Medley",
+]
+
+
+def test_energy_batch_matches_per_name_scoring(analyzer):
+    energies = analyzer._estimate_energy_batch(pd.Series(TRACK_NAMES + [None]))
+
+    expected = [reference_energy(name) for name in TRACK_NAMES] + [0.5]
+    assert energies == pytest.approx(expected)
+
+
+def test_prepare_data_adds_energy_and_year(analyzer):
+    tracks = [
+        {'id': 'a', 'name': "Club Remix", 'popularity': 80, 'album': {'release_date': '1994-05-01'}},
+        {'id': 'b', 'name': "Piano Ballad", 'popularity': 20, 'album': {'release_date': ''}},
+    ]
+
+    df = analyzer.prepare_data(tracks)
+
+    assert df['release_year'].tolist() == [1994, 2020]
+    assert df['name_energy'].tolist() == pytest.approx([0.7, 0.3])
+
+
+@pytest.mark.parametrize("year", [1965, 1979.9, 1980, 1985, 1990, 1999.5, 2000, 2009, 2010, 2019.99, 2020, 2024])
+def test_era_labels_match_per_cluster_rules(analyzer, year):
+    cluster = pd.DataFrame({'release_year': [year]})
+
+    assert analyzer._describe_music_styles(cluster.mean().to_frame().T) == [reference_style(cluster)]
+
+
+def test_style_descriptions_match_per_cluster_rules(analyzer):
+    rng = np.random.default_rng(7)
+    # Odd tenths never average to exactly 0.4 or 0.6 over three tracks, where summation order
+    # would decide the float comparison
+    df = pd.DataFrame({
+        'cluster': np.repeat(np.arange(40), 3),
+        'popularity': rng.integers(0, 100, 120),
+        'release_year': rng.integers(1960, 2025, 120),
+        'name_energy': rng.choice([0.1, 0.3, 0.5, 0.7, 0.9], 120),
+        'duration_ms': rng.integers(120_000, 420_000, 120),
+    })
+    groups = df.groupby('cluster', sort=True)
+
+    descriptions = analyzer._describe_music_styles(groups[['popularity', 'release_year', 'name_energy', 'duration_ms']].mean())
+
+    assert descriptions == [reference_style(cluster_data) for _, cluster_data in groups]
+
+
+def test_style_descriptions_without_metadata_columns(analyzer):
+    assert analyzer._describe_music_styles(pd.DataFrame(index=[0, 1])) == ["Mixed style", "Mixed style"]
+
+
+class TestClusterCache:
+
+    def test_labels_round_trip(self, analyzer):
+        cache_file = os.path.join(analyzer.cache_dir, "cluster_abc.npy")
+        analyzer._store_cached_labels(cache_file, np.array([0, 1, 1, 2]))
+
+        assert analyzer._load_cached_labels(cache_file, 4).tolist() == [0, 1, 1, 2]
+        assert os.listdir(analyzer.cache_dir) == ["cluster_abc.npy"]
+
+    def test_corrupt_file_is_discarded(self, analyzer):
+        os.makedirs(analyzer.cache_dir)
+        cache_file = os.path.join(analyzer.cache_dir, "cluster_abc.npy")
+        with open(cache_file, 'wb') as f:
+            f.write(b"\x93NUMPY truncated")
+
+        assert analyzer._load_cached_labels(cache_file, 4) is None
+        assert not os.path.exists(cache_file)
+
+    def test_length_mismatch_is_discarded(self, analyzer):
+        cache_file = os.path.join(analyzer.cache_dir, "cluster_abc.npy")
+        analyzer._store_cached_labels(cache_file, np.array([0, 1, 1]))
+
+        assert analyzer._load_cached_labels(cache_file, 4) is None
+        assert not os.path.exists(cache_file)
+
+    def test_prune_keeps_most_recently_used(self, analyzer):
+        analyzer.cache_limit = 2
+        for i in range(4):
+            cache_file = os.path.join(analyzer.cache_dir, f"cluster_{i}.npy")
+            analyzer._store_cached_labels(cache_file, np.array([i]))
+            os.utime(cache_file, (1000 + i, 1000 + i))
+
+        analyzer._prune_cluster_cache()
+
+        assert sorted(os.listdir(analyzer.cache_dir)) == ["cluster_2.npy", "cluster_3.npy"]
+
+    def test_cache_hit_reuses_labels_without_fitting(self, analyzer):
+        tracks = [
+            {'id': str(i), 'name': f"Song {i}", 'artist': "Band", 'popularity': 10 * i,
+             'duration_ms': 200_000 + 1000 * i, 'album': {'release_date': f"{1990 + i}-01-01"}}
+            for i in range(8)
+        ]
+        df = analyzer.prepare_data(tracks)
+        first, _ = analyzer.cluster_tracks(df.copy(), n_clusters=2)
+        assert analyzer.kmeans is not None
+
+        second, _ = analyzer.cluster_tracks(df.copy(), n_clusters=2)
+
+        assert analyzer.kmeans is None
+        assert second['cluster'].tolist() == first['cluster'].tolist()
@@ -0,0 +1,60 @@
+"""Tests for the plain-text progress fallback."""
+
+from io import StringIO
+
+from rich.console import Console
+from rich.progress import Progress
+
+from wedding_playlist.progress import PlainProgress, create_progress
+
+
+class RecordingConsole:
+    """Console stand-in that keeps printed lines."""
+
+    def __init__(self):
+        self.lines = []
+
+    def print(self, text, **kwargs):
+        self.lines.append(text)
+
+
+def test_prints_about_one_line_per_step():
+    console = RecordingConsole()
+    progress = PlainProgress(console, steps=4)
+    task = progress.add_task("Enriching", total=8)
+
+    for _ in range(8):
+        progress.advance(task)
+
+    assert console.lines == ["Enriching 2/8", "Enriching 4/8", "Enriching 6/8", "Enriching 8/8"]
+
+
+def test_final_line_is_printed_once():
+    console = RecordingConsole()
+    progress = PlainProgress(console, steps=1)
+    task = progress.add_task("Saving", total=3)
+
+    progress.update(task, advance=3)
+    progress.update(task, advance=0)
+    progress.update(task, advance=0, description="Saved")
+
+    assert console.lines == ["Saving 3/3"]
+
+
+def test_description_updates_show_on_next_line():
+    console = RecordingConsole()
+    progress = PlainProgress(console, steps=2)
+    task = progress.add_task("Batch 1", total=2)
+
+    progress.update(task, advance=1)
+    progress.update(task, description="Batch 2")
+    progress.update(task, advance=1)
+
+    assert console.lines == ["Batch 1 1/2", "Batch 2 2/2"]
+
+
+def test_create_progress_picks_plain_counter_off_terminal():
+    console = Console(file=StringIO(), force_terminal=False)
+
+    assert isinstance(create_progress(console), PlainProgress)
+    assert isinstance(create_progress(console, disable=True), Progress)
@@ -0,0 +1,56 @@
+"""Shared, lazily constructed API clients reused across CLI commands."""
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+# Client modules pull in spotipy, openai, httpx, etc.; import them only when a client is built
+if TYPE_CHECKING:
+    from .spotify_client import SpotifyClient
+    from .ai_validator import AIValidator
+    from .playlist_generator import PlaylistGenerator
+    from .lastfm_enricher import LastFMEnricher
+
+
+@lru_cache(maxsize=1)
+def _spotify_client(client_id: str, client_secret: str, redirect_uri: str) -> "SpotifyClient":
+    from .spotify_client import SpotifyClient
+    return SpotifyClient()
+
+
+def get_spotify_client() -> "SpotifyClient":
+    """Return the shared Spotify client, rebuilt only when the credentials change."""
+    return _spotify_client(
+        os.environ.get('SPOTIFY_CLIENT_ID', ''),
+        os.environ.get('SPOTIFY_CLIENT_SECRET', ''),
+        os.environ.get('SPOTIFY_REDIRECT_URI', '')
+    )
+
+
+@lru_cache(maxsize=1)
+def _ai_validator(api_key: str) -> "AIValidator":
+    from .ai_validator import AIValidator
+    return AIValidator()
+
+
+def get_ai_validator() -> "AIValidator":
+    """Return the shared AI validator, rebuilt only when the DeepSeek key changes."""
+    return _ai_validator(os.environ.get('DEEPSEEK_API_KEY', ''))
+
+
+@lru_cache(maxsize=1)
+def get_playlist_generator() -> "PlaylistGenerator":
+    """Return the shared playlist generator."""
+    from .playlist_generator import PlaylistGenerator
+    return PlaylistGenerator()
+
+
+@lru_cache(maxsize=1)
+def _lastfm_enricher(api_key: str) -> "LastFMEnricher":
+    from .lastfm_enricher import LastFMEnricher
+    return LastFMEnricher()
+
+
+def get_lastfm_enricher() -> "LastFMEnricher":
+    """Return the shared Last.fm enricher, rebuilt only when the Last.fm key changes."""
+    return _lastfm_enricher(os.environ.get('LASTFM_API_KEY', ''))
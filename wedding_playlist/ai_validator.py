@@ -1,13 +1,24 @@
 """AI-powered track validation for party playlists."""
 
+import io
 import os
+import re
+import math
 import json
 import time
+import random
+import asyncio
+import atexit
+import hashlib
+import sqlite3
 from datetime import datetime
-from typing import List, Dict, Any
-from openai import OpenAI
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import numpy as np
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
 from rich.console import Console
-from rich.progress import Progress, TaskID
+from .progress import create_progress
+from .lastfm_enricher import format_lastfm_for_ai
 
 # Ensure environment variables are loaded
 try:
@@ -16,250 +27,713 @@ try:
 except ImportError:
     pass  # dotenv not available, assume env vars are set manually
 
-console = Console()
+console = Console(highlight=False)
+
+# Track name keywords used to estimate energy
+HIGH_ENERGY_RE = re.compile(r'party|dance|pump|energy|wild|crazy|fire|hype|upbeat|bounce')
+LOW_ENERGY_RE = re.compile(r'slow|ballad|sad|melancholy|quiet|soft|gentle|calm|peaceful')
+
+# Constant prompt text kept byte-identical across batches so DeepSeek's
+# prefix cache can reuse it; only the track list after it varies
+SYSTEM_PROMPT = "You are a music expert specializing in party and wedding playlists."
+VALIDATION_PROMPT_PREFIX = """Rate each track's suitability for a wedding/party playlist.
+Consider danceability, energy, mood, and overall party atmosphere.
+
+Return only a JSON array of [score, rec] pairs in track order, where score is 1-10 \
+(1=terrible, 10=perfect) and rec is "y", "n", or "m" (yes/no/maybe). Example: [[8,"y"],[3,"n"]]
+
+Tracks:
+"""
+
+# Bump to invalidate cached AI scores when their stored format changes
+AI_CACHE_VERSION = 2
+
+# Sentinel for distinguishing absent track fields from falsy values
+MISSING = object()
+
+# Compact recommendation codes requested from the AI
+RECOMMENDATION_CODES = {'y': 'yes', 'n': 'no', 'm': 'maybe'}
+
+# Shared decoder for pulling the JSON array out of AI responses
+json_decoder = json.JSONDecoder()
+
+
+@lru_cache(maxsize=4096)
+def estimate_name_energy(track_name: str) -> str:
+    """Estimate energy level from track name keywords, memoized for recently seen names."""
+    if not track_name:
+        return ""
+    
+    track_lower = track_name.lower()
+    
+    # Count distinct keywords present, as a single C-level regex scan each
+    high_count = len(set(HIGH_ENERGY_RE.findall(track_lower)))
+    low_count = len(set(LOW_ENERGY_RE.findall(track_lower)))
+    
+    if high_count > low_count:
+        return "High"
+    elif low_count > high_count:
+        return "Low"
+    else:
+        return "Medium"
+
+
+def set_ai_result(track: Dict[str, Any], score: Any, reasoning: str, recommendation: str):
+    """Write the three AI result fields onto a track in place."""
+    track['ai_party_score'] = score
+    track['ai_reasoning'] = reasoning
+    track['ai_recommendation'] = recommendation
+
+
+def parse_score_pair(item: Any) -> Optional[Tuple[int, str]]:
+    """
+    Validate one compact [score, rec] result from the AI.
+    
+    Args:
+        item: Decoded array element, expected to be [score, rec]
+        
+    Returns:
+        Tuple of (score as an int clamped to 1-10, recommendation), or None if unusable
+    """
+    if not isinstance(item, (list, tuple)) or len(item) < 2:
+        return None
+    
+    score, rec = item[0], item[1]
+    if isinstance(score, bool):
+        return None
+    try:
+        score = float(score)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(score):
+        return None
+    score = min(max(int(round(score)), 1), 10)
+    
+    # Accept the compact codes as well as spelled-out yes/no/maybe
+    recommendation = 'maybe'
+    if isinstance(rec, str):
+        recommendation = RECOMMENDATION_CODES.get(rec.strip().lower()[:1], 'maybe')
+    return score, recommendation
+
+
+class StreamingArrayParser:
+    """Incrementally extracts complete elements of a top-level JSON array from streamed text."""
+    
+    def __init__(self):
+        """Initialize an empty parser state."""
+        self.text = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.element_start = None
+        self.items = []
+    
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk of text and return the array elements it completed."""
+        self.text += chunk
+        completed = []
+        
+        for i in range(self.position, len(self.text)):
+            char = self.text[i]
+            
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+                if self.depth == 2:
+                    self.element_start = i
+            elif char in ']}':
+                self.depth -= 1
+                if self.depth == 1 and self.element_start is not None:
+                    try:
+                        completed.append(json.loads(self.text[self.element_start:i + 1]))
+                    except ValueError:
+                        pass  # Malformed element, the full-response parse decides
+                    self.element_start = None
+        
+        self.position = len(self.text)
+        self.items.extend(completed)
+        return completed
+
+
+class TokenBucket:
+    """Paces requests to stay under per-minute request and token limits."""
+    
+    def __init__(self, rpm: int, tpm: int):
+        """Initialize the bucket with full request and token capacity."""
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests_available = float(rpm)
+        self.tokens_available = float(tpm)
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+    
+    def _refill(self):
+        """Top up capacity proportionally to the time elapsed since the last refill."""
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.requests_available = min(self.rpm, self.requests_available + elapsed * self.rpm / 60)
+        self.tokens_available = min(self.tpm, self.tokens_available + elapsed * self.tpm / 60)
+    
+    async def acquire(self, tokens: int):
+        """Wait until one request and the given number of tokens can be spent."""
+        # Never wait for more tokens than the bucket can ever hold
+        tokens = min(tokens, self.tpm)
+        
+        while True:
+            self._refill()
+            now = time.monotonic()
+            
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            
+            if self.requests_available >= 1 and self.tokens_available >= tokens:
+                self.requests_available -= 1
+                self.tokens_available -= tokens
+                return
+            
+            # Sleep just long enough for the scarcer resource to refill
+            request_wait = (1 - self.requests_available) * 60 / self.rpm
+            token_wait = (tokens - self.tokens_available) * 60 / self.tpm
+            await asyncio.sleep(max(request_wait, token_wait, 0.01))
+    
+    def pause(self, seconds: float):
+        """Hold back all requests for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.requests_available = 0
 
 
 class AIValidator:
     """Uses AI to validate tracks for party playlist suitability."""
     
-    def __init__(self):
-        """Initialize the AI validator."""
+    def __init__(self, max_concurrency: int = 8, rpm: int = 60, tpm: int = 100_000):
+        """
+        Initialize the AI validator.
+        
+        Args:
+            max_concurrency: Maximum number of DeepSeek requests in flight at once
+            rpm: Requests per minute to stay under
+            tpm: Tokens per minute to stay under
+        """
         # Initialize OpenAI client (DeepSeek API)
         api_key = os.getenv('DEEPSEEK_API_KEY')
         if not api_key:
             console.print("⚠️ DEEPSEEK_API_KEY not found - AI validation will be skipped")
             self.client = None
         else:
-            self.client = OpenAI(
+            self.client = AsyncOpenAI(
                 api_key=api_key,
                 base_url="https://api.deepseek.com"
             )
         
+        self.model = "deepseek-chat"
+        
+        # Concurrency and rate limits for DeepSeek calls
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_tokens = 300
+        self.max_retries = 5
+        self.retry_base_delay = 1.0
+        self.retry_max_delay = 30.0
+        
+        # Polling bounds for offline Batch API jobs (seconds)
+        self.batch_poll_initial = 10
+        self.batch_poll_max = 300
+        
         # Create logs directory
         self.logs_dir = "output/ai_logs"
         os.makedirs(self.logs_dir, exist_ok=True)
+        
+        # Log file handles are opened on the first logged batch and reused for the run
+        self._log_fh = None
+        self._ndjson_fh = None
+        atexit.register(self._close_logs)
+        
+        # Persistent cache of AI scores so unchanged tracks are not re-scored
+        self.cache_path = "output/ai_cache.sqlite"
+        self.cache = sqlite3.connect(self.cache_path)
+        self.cache.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache "
+            "(key TEXT PRIMARY KEY, score INTEGER, reasoning TEXT, rec TEXT)"
+        )
+        self.cache.commit()
+        self.cache_hits = 0
+        self.use_cache = True
+        
+        # Cached scores are only valid for the model and instructions that produced them
+        self._cache_namespace = hashlib.sha256(
+            f"{self.model}\x1f{SYSTEM_PROMPT}\x1f{VALIDATION_PROMPT_PREFIX}\x1f{AI_CACHE_VERSION}".encode('utf-8')
+        ).hexdigest()
+        
+        # Prompts already built this session, keyed by the batch's track cache keys
+        self._prompt_memo: Dict[Tuple[str, ...], str] = {}
     
-    def validate_tracks_for_party(self, tracks: List[Dict[str, Any]], batch_size: int = 5) -> List[Dict[str, Any]]:
-        """Validate tracks for party playlist suitability using AI."""
+    def validate_tracks_for_party(self, tracks: List[Dict[str, Any]], batch_size: int = 5,
+                                  use_batch_api: bool = False, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Validate tracks for party playlist suitability using AI.
+        
+        Args:
+            tracks: List of track dictionaries
+            batch_size: Number of tracks per prompt
+            use_batch_api: Submit all prompts as one offline Batch API job (cheaper, may take hours)
+            use_cache: Reuse cached AI scores; pass False to always query the API
+        
+        Returns:
+            The same tracks, updated with AI scores
+        """
         
         if not self.client:
             console.print("⚠️ AI validation skipped - no API key")
             # Return tracks with default scores
             for track in tracks:
-                track.update({
-                    'ai_party_score': 5,
-                    'ai_reasoning': 'AI validation unavailable',
-                    'ai_recommendation': 'maybe'
-                })
+                set_ai_result(track, 5, 'AI validation unavailable', 'maybe')
             return tracks
         
-        console.print(f"🤖 Validating {len(tracks)} tracks with AI...")
+        # Score each distinct track once, duplicates get the same result afterwards
+        unique_tracks = {}
+        for track in tracks:
+            unique_tracks.setdefault(self._dedup_key(track), track)
+        
+        # Score clearly unsuitable tracks locally so they never reach the API
+        candidates = self._prefilter_tracks(list(unique_tracks.values()))
         
-        validated_tracks = []
+        console.print(f"🤖 Validating {len(candidates)} tracks with AI...")
         
-        with Progress() as progress:
+        self.use_cache = use_cache
+        
+        if use_batch_api:
+            asyncio.run(self._validate_with_batch_api(candidates, batch_size))
+        else:
+            asyncio.run(self._validate_all(candidates, batch_size))
+        
+        for track in tracks:
+            original = unique_tracks[self._dedup_key(track)]
+            if original is not track:
+                set_ai_result(
+                    track,
+                    original.get('ai_party_score', 5),
+                    original.get('ai_reasoning', ''),
+                    original.get('ai_recommendation', 'maybe')
+                )
+        
+        return tracks
+    
+    def _dedup_key(self, track: Dict[str, Any]) -> Any:
+        """Identify a track by Spotify ID, or by artist and name when the ID is missing."""
+        return track.get('id') or (str(track.get('artist', '')).lower(), str(track.get('name', '')).lower())
+    
+    def _prefilter_tracks(self, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reject tracks with both low energy and low danceability without asking the AI."""
+        
+        # Missing audio features become NaN, which never compares below the threshold
+        features = np.array(
+            [[track.get('energy', np.nan), track.get('danceability', np.nan)] for track in tracks],
+            dtype=np.float32
+        ).reshape(-1, 2)
+        rejected = (features[:, 0] < 0.3) & (features[:, 1] < 0.3)
+        
+        candidates = []
+        for track, is_rejected in zip(tracks, rejected):
+            if is_rejected:
+                set_ai_result(track, 2, 'Pre-filtered: low energy and low danceability', 'no')
+            else:
+                candidates.append(track)
+        
+        if len(candidates) < len(tracks):
+            console.print(f"⏭️ Pre-filtered {len(tracks) - len(candidates)} low-energy tracks")
+        
+        return candidates
+    
+    async def _validate_all(self, tracks: List[Dict[str, Any]], batch_size: int) -> List[Dict[str, Any]]:
+        """Validate all batches concurrently, preserving the original track order."""
+        
+        # Created per run since each asyncio.run() starts a fresh event loop
+        self.sem = asyncio.Semaphore(self.max_concurrency)
+        self.bucket = TokenBucket(self.rpm, self.tpm)
+        self.cache_hits = 0
+        self.prompt_cache_hit_tokens = 0
+        
+        with create_progress(console) as progress:
             task = progress.add_task("Validating tracks...", total=len(tracks))
             
-            for i in range(0, len(tracks), batch_size):
-                batch_number = (i // batch_size) + 1
-                batch = tracks[i:i + batch_size]
-                batch_results = self._validate_batch(batch, batch_number)
-                validated_tracks.extend(batch_results)
-                progress.update(task, advance=len(batch))
+            async def run_batch(batch: List[Dict[str, Any]], batch_number: int) -> List[Dict[str, Any]]:
+                advanced = 0
+                
+                def advance(count: int):
+                    # Advance per track as results stream in, never past the batch size
+                    nonlocal advanced
+                    count = min(count, len(batch) - advanced)
+                    advanced += count
+                    progress.update(task, advance=count)
+                
+                batch_results = await self._validate_batch(batch, batch_number, advance)
+                advance(len(batch) - advanced)
+                return batch_results
+            
+            batch_tasks = [
+                run_batch(tracks[i:i + batch_size], (i // batch_size) + 1)
+                for i in range(0, len(tracks), batch_size)
+            ]
+            results = await asyncio.gather(*batch_tasks)
+        
+        validated_tracks = []
+        for batch_results in results:
+            validated_tracks.extend(batch_results)
+        
+        if self.cache_hits:
+            console.print(f"♻️ Reused cached AI scores for {self.cache_hits} tracks")
+        if self.prompt_cache_hit_tokens:
+            console.print(f"⚡ DeepSeek prompt cache hits: {self.prompt_cache_hit_tokens:,} tokens")
         
         return validated_tracks
     
-    def _validate_batch(self, tracks: List[Dict[str, Any]], batch_number: int) -> List[Dict[str, Any]]:
+    async def _validate_batch(self, tracks: List[Dict[str, Any]], batch_number: int,
+                              on_progress: Optional[Callable[[int], None]] = None) -> List[Dict[str, Any]]:
         """Validate a batch of tracks using DeepSeek API."""
         
+        # Serve previously scored tracks from the cache, only send the rest to the API
+        pending_tracks, pending_keys, pending_descriptions = self._split_cached(tracks)
+        
+        if not pending_tracks:
+            return tracks
+        
         try:
-            # Prepare track information for AI analysis (metadata only)
-            track_info = []
-            for track in tracks:
-                # Just pass the track as-is since we now use metadata
-                track_info.append(track)
-            
             # Create prompt for AI
-            prompt = self._create_validation_prompt(track_info)
+            prompt = self._prompt_for_batch(pending_descriptions, pending_keys)
             
             # Call DeepSeek API
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "You are a music expert specializing in party and wedding playlists."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=2000
-            )
-            
-            ai_response = response.choices[0].message.content
+            ai_response, streamed_results = await self._request_completion(prompt, on_progress)
             
             # Parse AI response and update tracks
-            validation_results = self._parse_ai_response(ai_response, tracks)
+            validation_results = self._parse_ai_response(ai_response, pending_tracks, streamed_results)
+            self._store_cached_results(pending_keys, validation_results)
             
             # Log the validation batch
-            self.log_validation_batch(batch_number, tracks, prompt, ai_response, validation_results)
-            
-            return validation_results
+            self.log_validation_batch(batch_number, pending_tracks, prompt, ai_response, validation_results)
             
         except Exception as e:
             console.print(f"⚠️ Error in AI validation: {e}")
-            # Return tracks with default AI scores
+            # Fall back to default AI scores
             error_results = []
-            for track in tracks:
-                error_result = {
-                    'ai_party_score': 5,
-                    'ai_reasoning': f'API Error: {str(e)}',
-                    'ai_recommendation': 'maybe'
-                }
-                track.update(error_result)
+            for track in pending_tracks:
+                set_ai_result(track, 5, f'API Error: {str(e)}', 'maybe')
                 error_results.append(track)
             
             # Log the error
-            self.log_validation_batch(batch_number, tracks, "ERROR", str(e), error_results)
+            self.log_validation_batch(batch_number, pending_tracks, "ERROR", str(e), error_results)
+        
+        return tracks
+    
+    async def _validate_with_batch_api(self, tracks: List[Dict[str, Any]], batch_size: int):
+        """Score uncached tracks through one offline Batch API job, polling until it finishes."""
+        
+        self.cache_hits = 0
+        batches = []
+        for i in range(0, len(tracks), batch_size):
+            pending_tracks, pending_keys, pending_descriptions = self._split_cached(tracks[i:i + batch_size])
+            if pending_tracks:
+                prompt = self._prompt_for_batch(pending_descriptions, pending_keys)
+                batches.append((f"batch-{(i // batch_size) + 1}", pending_tracks, pending_keys, prompt))
+        
+        if self.cache_hits:
+            console.print(f"♻️ Reused cached AI scores for {self.cache_hits} tracks")
+        
+        if not batches:
+            return
+        
+        # One JSONL line per prompt, same request body as the interactive path
+        jsonl = "".join(
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._completion_params(prompt)
+            }, ensure_ascii=False) + "\n"
+            for custom_id, _, _, prompt in batches
+        )
+        
+        try:
+            input_file = await self.client.files.create(
+                file=("ai_validation_batch.jsonl", io.BytesIO(jsonl.encode('utf-8'))),
+                purpose="batch"
+            )
+            job = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        except Exception as e:
+            console.print(f"⚠️ Batch API unavailable ({e}) - falling back to interactive validation")
+            await self._validate_all(tracks, batch_size)
+            return
+        
+        console.print(f"📦 Submitted batch job {job.id} with {len(batches)} prompts, waiting for results...")
+        
+        # Poll with exponential backoff until the job reaches a final state
+        delay = self.batch_poll_initial
+        while job.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.batch_poll_max)
+            job = await self.client.batches.retrieve(job.id)
+            console.print(f"⏳ Batch job {job.id}: {job.status}")
+        
+        responses = {}
+        if job.output_file_id:
+            output = await self.client.files.content(job.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if response.get('status_code') == 200:
+                    responses[entry['custom_id']] = response['body']['choices'][0]['message']['content']
+        
+        for batch_number, (custom_id, pending_tracks, pending_keys, prompt) in enumerate(batches, 1):
+            ai_response = responses.get(custom_id)
+            if ai_response is None:
+                error = f"Batch API error: job {job.status}, no result for {custom_id}"
+                for track in pending_tracks:
+                    set_ai_result(track, 5, error, 'maybe')
+                self.log_validation_batch(batch_number, pending_tracks, "ERROR", error, pending_tracks)
+                continue
             
-            return error_results
+            validation_results = self._parse_ai_response(ai_response, pending_tracks)
+            self._store_cached_results(pending_keys, validation_results)
+            self.log_validation_batch(batch_number, pending_tracks, prompt, ai_response, validation_results)
     
-    def _create_validation_prompt(self, track_info: List[Dict[str, Any]]) -> str:
-        """Create a prompt for the AI to validate party suitability."""
-        prompt = """Analyze the following tracks for their suitability in a wedding/party playlist. 
-Consider factors like danceability, energy, mood, and overall party atmosphere.
-
-For each track, provide:
-1. party_score (1-10): How suitable is this track for a party? (1=terrible, 10=perfect)
-2. reasoning: Brief explanation of why it fits or doesn't fit
-3. recommendation: "yes", "no", or "maybe"
-
-Tracks to analyze:
-"""
+    def _split_cached(self, tracks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+        """
+        Apply cached results where available and describe the remaining tracks for the AI.
         
-        for i, track in enumerate(track_info, 1):
-            track_description = self._format_track_for_ai(track)
-            prompt += f"\n{i}. {track_description}"
+        Args:
+            tracks: Tracks in one batch
+            
+        Returns:
+            Tuple of (uncached tracks, their cache keys, their prompt descriptions)
+        """
+        pending_tracks = []
+        pending_keys = []
+        pending_descriptions = []
+        for track in tracks:
+            # Formatted once: the same line keys the cache and goes into the prompt
+            description = self._format_track_for_ai(track)
+            key = self._cache_key(description)
+            if self.use_cache and self._load_cached_result(key, track):
+                self.cache_hits += 1
+            else:
+                pending_tracks.append(track)
+                pending_keys.append(key)
+                pending_descriptions.append(description)
+        return pending_tracks, pending_keys, pending_descriptions
+    
+    def _cache_key(self, description: str) -> str:
+        """Hash the exact track description the AI is shown (name, artist, features) and the model/prompt version."""
+        return hashlib.sha256(f"{self._cache_namespace}\x1f{description}".encode('utf-8')).hexdigest()
+    
+    def _load_cached_result(self, key: str, track: Dict[str, Any]) -> bool:
+        """Apply a cached AI result to the track, returning whether one was found."""
+        row = self.cache.execute(
+            "SELECT score, reasoning, rec FROM ai_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return False
+        
+        score, reasoning, rec = row
+        # Older cache files declared the column REAL, which hands whole-number scores back as floats
+        if isinstance(score, float) and score.is_integer():
+            score = int(score)
+        set_ai_result(track, score, reasoning, rec)
+        return True
+    
+    def _store_cached_results(self, keys: List[str], tracks: List[Dict[str, Any]]):
+        """Persist AI results, skipping tracks that only received fallback scores."""
+        rows = [
+            (key, track['ai_party_score'], track.get('ai_reasoning', ''), track.get('ai_recommendation', 'maybe'))
+            for key, track in zip(keys, tracks)
+            if 'ai_party_score' in track and not str(track.get('ai_reasoning', '')).startswith('Parsing error')
+        ]
+        if rows:
+            self.cache.executemany(
+                "INSERT OR REPLACE INTO ai_cache (key, score, reasoning, rec) VALUES (?, ?, ?, ?)", rows
+            )
+            self.cache.commit()
+    
+    async def _request_completion(self, prompt: str,
+                                  on_progress: Optional[Callable[[int], None]] = None) -> Tuple[str, List[Any]]:
+        """
+        Stream a completion from DeepSeek, pacing requests and retrying transient failures.
+        
+        Args:
+            prompt: User prompt to send
+            on_progress: Called with the number of track results completed by each chunk
+        
+        Returns:
+            Tuple of (full response text, array elements parsed while streaming)
+        """
+        
+        # Rough token estimate: ~4 characters per token plus the completion budget
+        est_tokens = len(prompt) // 4 + self.max_tokens
+        
+        async with self.sem:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire(est_tokens)
+                try:
+                    stream = await self.client.chat.completions.create(
+                        **self._completion_params(prompt),
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    
+                    parser = StreamingArrayParser()
+                    async for chunk in stream:
+                        if chunk.usage:
+                            self.prompt_cache_hit_tokens += getattr(chunk.usage, 'prompt_cache_hit_tokens', 0) or 0
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        completed = parser.feed(chunk.choices[0].delta.content)
+                        if completed and on_progress:
+                            on_progress(len(completed))
+                    
+                    return parser.text, parser.items
+                except RateLimitError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    retry_after = self._get_retry_after(e)
+                    console.print(f"⏳ Rate limited by DeepSeek, retrying in {retry_after:.1f}s...")
+                    self.bucket.pause(retry_after)
+                    await asyncio.sleep(retry_after)
+                except (APIConnectionError, InternalServerError) as e:
+                    # Transient network/server error: retry the same prompt with full jitter
+                    if attempt == self.max_retries:
+                        raise
+                    delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                    console.print(f"⏳ DeepSeek request failed ({e}), retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+    
+    def _completion_params(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat completion request body for a validation prompt."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": self.max_tokens
+        }
+    
+    def _get_retry_after(self, error: RateLimitError) -> float:
+        """Read the server's retry-after hint, defaulting to a short pause."""
+        try:
+            return float(error.response.headers.get('retry-after', 5))
+        except (AttributeError, TypeError, ValueError):
+            return 5.0
+    
+    def _prompt_for_batch(self, descriptions: List[str], keys: List[str]) -> str:
+        """Return the prompt for a batch, reusing it when the same tracks were batched before."""
+        # Cache keys already hash each track's full description, so they identify the prompt
+        batch_key = tuple(keys)
+        prompt = self._prompt_memo.get(batch_key)
+        if prompt is None:
+            if len(self._prompt_memo) >= 1024:
+                self._prompt_memo.clear()
+            prompt = self._create_validation_prompt(descriptions)
+            self._prompt_memo[batch_key] = prompt
+        return prompt
+    
+    def _create_validation_prompt(self, descriptions: List[str]) -> str:
+        """Create a prompt for the AI to validate party suitability from formatted track descriptions."""
+        parts = [VALIDATION_PROMPT_PREFIX]
         
-        prompt += """
-
-Please respond in JSON format with an array of objects, each containing:
-{
-  "track_number": number,
-  "party_score": number,
-  "reasoning": "string",
-  "recommendation": "yes/no/maybe"
-}
-"""
+        for i, track_description in enumerate(descriptions, 1):
+            parts.append(f"\n{i}. {track_description}")
         
-        return prompt
+        return "".join(parts)
     
     def _format_track_for_ai(self, track: Dict[str, Any]) -> str:
         """Format track information for AI analysis (metadata-based with Last.fm enrichment)."""
         
-        # Basic track info
-        track_info = f"Track: {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown Artist')}"
+        # Each field is looked up once and bound locally
+        parts = [f"Track: {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown Artist')}"]
+        append = parts.append
         
         # Add available Spotify metadata
-        metadata_parts = []
-        
-        if 'popularity' in track:
-            metadata_parts.append(f"Spotify popularity: {track['popularity']}/100")
+        popularity = track.get('popularity', MISSING)
+        if popularity is not MISSING:
+            append(f"Spotify popularity: {popularity}/100")
         
-        if 'release_year' in track:
-            metadata_parts.append(f"Year: {track['release_year']}")
+        release_year = track.get('release_year', MISSING)
+        if release_year is not MISSING:
+            append(f"Year: {release_year}")
         
-        if 'duration_ms' in track:
-            duration_min = track['duration_ms'] / (1000 * 60)
-            metadata_parts.append(f"Duration: {duration_min:.1f}min")
+        duration_ms = track.get('duration_ms', MISSING)
+        if duration_ms is not MISSING:
+            append(f"Duration: {duration_ms / 60000:.1f}min")
         
         # Add estimated energy from track name analysis
-        name_energy = self._estimate_energy_from_name(track.get('name', ''))
+        name_energy = estimate_name_energy(track.get('name', ''))
         if name_energy:
-            metadata_parts.append(f"Estimated energy: {name_energy}")
+            append(f"Estimated energy: {name_energy}")
         
         # Add album info if available
-        if 'album' in track and isinstance(track['album'], dict):
-            album_name = track['album'].get('name', '')
+        album = track.get('album')
+        if isinstance(album, dict):
+            album_name = album.get('name', '')
             if album_name:
-                metadata_parts.append(f"Album: {album_name}")
-        
-        # Add Last.fm metadata if available
-        lastfm_data = track.get('lastfm', {})
-        if lastfm_data:
-            # Add Last.fm popularity metrics
-            if 'playcount' in lastfm_data and lastfm_data['playcount'] > 0:
-                metadata_parts.append(f"Last.fm plays: {lastfm_data['playcount']:,}")
-            
-            if 'listeners' in lastfm_data and lastfm_data['listeners'] > 0:
-                metadata_parts.append(f"Last.fm listeners: {lastfm_data['listeners']:,}")
-            
-            # Add genres/tags from Last.fm
-            if 'genres' in lastfm_data and lastfm_data['genres']:
-                genres_str = ', '.join(lastfm_data['genres'][:3])  # Top 3 genres
-                metadata_parts.append(f"Genres: {genres_str}")
-            
-            # Add artist popularity from Last.fm
-            artist_info = lastfm_data.get('artist_info', {})
-            if 'listeners' in artist_info and artist_info['listeners'] > 0:
-                metadata_parts.append(f"Artist listeners: {artist_info['listeners']:,}")
-            
-            # Add artist style tags
-            if 'artist_tags' in lastfm_data and lastfm_data['artist_tags']:
-                artist_tags_str = ', '.join(lastfm_data['artist_tags'][:2])  # Top 2 artist tags
-                metadata_parts.append(f"Artist style: {artist_tags_str}")
-            
-            # Add similar tracks for context
-            if 'similar_tracks' in lastfm_data and lastfm_data['similar_tracks']:
-                similar = lastfm_data['similar_tracks'][:2]  # Top 2 similar tracks
-                similar_str = ', '.join([f"{s['artist']} - {s['track']}" for s in similar])
-                metadata_parts.append(f"Similar to: {similar_str}")
+                append(f"Album: {album_name}")
         
-        # Combine all metadata
-        if metadata_parts:
-            track_info += " | " + " | ".join(metadata_parts)
+        # Add Last.fm metadata, preferring the string precomputed at enrichment
+        lastfm_string = track.get('lastfm_ai_string')
+        if lastfm_string is None:
+            lastfm_string = format_lastfm_for_ai(track.get('lastfm', {}))
+        if lastfm_string:
+            append(lastfm_string)
         
-        return track_info
+        # Combine all metadata in a single join
+        return " | ".join(parts)
 
-    def _estimate_energy_from_name(self, track_name: str) -> str:
-        """Estimate energy level from track name keywords."""
-        if not track_name:
-            return ""
-        
-        track_lower = track_name.lower()
-        
-        # High energy keywords
-        high_energy_words = ['party', 'dance', 'pump', 'energy', 'wild', 'crazy', 'fire', 'hype', 'upbeat', 'bounce']
-        # Low energy keywords  
-        low_energy_words = ['slow', 'ballad', 'sad', 'melancholy', 'quiet', 'soft', 'gentle', 'calm', 'peaceful']
-        
-        high_count = sum(1 for word in high_energy_words if word in track_lower)
-        low_count = sum(1 for word in low_energy_words if word in track_lower)
-        
-        if high_count > low_count:
-            return "High"
-        elif low_count > high_count:
-            return "Low"
-        else:
-            return "Medium"
-    
-    def _parse_ai_response(self, ai_response: str, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _parse_ai_response(self, ai_response: str, tracks: List[Dict[str, Any]],
+                           streamed_results: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
         """Parse AI response and update track information."""
         
         try:
-            # Try to extract JSON from the response
+            # Decode the JSON array in place, starting at its opening bracket
             json_start = ai_response.find('[')
-            json_end = ai_response.rfind(']') + 1
             
-            if json_start != -1 and json_end > json_start:
-                json_str = ai_response[json_start:json_end]
-                ai_results = json.loads(json_str)
+            if json_start != -1:
+                try:
+                    ai_results, _ = json_decoder.raw_decode(ai_response, json_start)
+                except ValueError:
+                    # Malformed or truncated tail: keep the results that streamed in intact
+                    if not streamed_results:
+                        raise
+                    ai_results = streamed_results
+                
+                if not isinstance(ai_results, list):
+                    raise ValueError("AI response is not a JSON array")
                 
-                # Update tracks with AI results
-                for i, result in enumerate(ai_results):
-                    if i < len(tracks):
-                        tracks[i].update({
-                            'ai_party_score': result.get('party_score', 5),
-                            'ai_reasoning': result.get('reasoning', 'No reasoning provided'),
-                            'ai_recommendation': result.get('recommendation', 'maybe')
-                        })
+                # Update tracks with AI results, one [score, rec] pair per track
+                for i, track in enumerate(tracks):
+                    if i >= len(ai_results):
+                        set_ai_result(track, 5, 'Parsing error: no result returned for this track', 'maybe')
+                        continue
+                    parsed = parse_score_pair(ai_results[i])
+                    if parsed is None:
+                        set_ai_result(track, 5, f'Parsing error: invalid result {ai_results[i]!r}', 'maybe')
+                    else:
+                        set_ai_result(track, parsed[0], '', parsed[1])
             else:
                 raise ValueError("No valid JSON found in response")
                 
@@ -267,11 +741,7 @@ Please respond in JSON format with an array of objects, each containing:
             console.print(f"⚠️ Error parsing AI response: {e}")
             # Fallback: assign default scores
             for track in tracks:
-                track.update({
-                    'ai_party_score': 5,
-                    'ai_reasoning': f'Parsing error: {str(e)}',
-                    'ai_recommendation': 'maybe'
-                })
+                set_ai_result(track, 5, f'Parsing error: {str(e)}', 'maybe')
         
         return tracks
     
@@ -279,42 +749,35 @@ Please respond in JSON format with an array of objects, each containing:
                            prompt: str, ai_response: str, results: List[Dict[str, Any]]):
         """Log the complete AI validation process for review."""
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Create human-readable log
-        log_filename = f"ai_validation_{timestamp}.log"
-        log_path = os.path.join(self.logs_dir, log_filename)
-        
-        # Create detailed JSON log
-        json_filename = f"ai_detailed_{timestamp}.json"
-        json_path = os.path.join(self.logs_dir, json_filename)
+        if self._log_fh is None:
+            self._open_logs()
         
         # Write human-readable log
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(f"BATCH {batch_number} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"{'='*80}\n\n")
-            
-            f.write("TRACKS BEING ANALYZED:\n")
-            f.write("-" * 40 + "\n")
-            for i, track in enumerate(tracks, 1):
-                f.write(f"{i}. {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown')}\n")
-            
-            f.write(f"\nAI PROMPT SENT:\n")
-            f.write("-" * 40 + "\n")
-            f.write(prompt + "\n")
-            
-            f.write(f"\nAI RESPONSE RECEIVED:\n")
-            f.write("-" * 40 + "\n")
-            f.write(ai_response + "\n")
-            
-            f.write(f"\nPARSED RESULTS:\n")
-            f.write("-" * 40 + "\n")
-            for track in results:
-                f.write(f"• {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown')}\n")
-                f.write(f"  Score: {track.get('ai_party_score', 'N/A')}/10\n")
-                f.write(f"  Recommendation: {track.get('ai_recommendation', 'N/A')}\n")
-                f.write(f"  Reasoning: {track.get('ai_reasoning', 'N/A')}\n\n")
+        f = self._log_fh
+        f.write(f"\n{'='*80}\n")
+        f.write(f"BATCH {batch_number} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"{'='*80}\n\n")
+        
+        f.write("TRACKS BEING ANALYZED:\n")
+        f.write("-" * 40 + "\n")
+        for i, track in enumerate(tracks, 1):
+            f.write(f"{i}. {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown')}\n")
+        
+        f.write(f"\nAI PROMPT SENT:\n")
+        f.write("-" * 40 + "\n")
+        f.write(prompt + "\n")
+        
+        f.write(f"\nAI RESPONSE RECEIVED:\n")
+        f.write("-" * 40 + "\n")
+        f.write(ai_response + "\n")
+        
+        f.write(f"\nPARSED RESULTS:\n")
+        f.write("-" * 40 + "\n")
+        for track in results:
+            f.write(f"• {track.get('name', 'Unknown')} by {track.get('artist', 'Unknown')}\n")
+            f.write(f"  Score: {track.get('ai_party_score', 'N/A')}/10\n")
+            f.write(f"  Recommendation: {track.get('ai_recommendation', 'N/A')}\n")
+            f.write(f"  Reasoning: {track.get('ai_reasoning', 'N/A')}\n\n")
         
         # Write detailed JSON log
         log_entry = {
@@ -326,21 +789,33 @@ Please respond in JSON format with an array of objects, each containing:
             "results": results
         }
         
-        # Read existing log or create new
-        json_data = []
-        if os.path.exists(json_path):
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    json_data = json.load(f)
-            except:
-                json_data = []
+        # Append-only so each batch costs the same regardless of log size
+        self._ndjson_fh.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
         
-        json_data.append(log_entry)
+        f.flush()
+        self._ndjson_fh.flush()
+        
+        console.print(f"📝 Logged batch {batch_number} to {self.log_filename} and {self.json_filename}")
+    
+    def _open_logs(self):
+        """Open this run's human-readable and NDJSON log files."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
+        # Create human-readable log
+        self.log_filename = f"ai_validation_{timestamp}.log"
+        self._log_fh = open(os.path.join(self.logs_dir, self.log_filename), 'a', encoding='utf-8')
         
-        console.print(f"📝 Logged batch {batch_number} to {log_filename} and {json_filename}")
+        # Create detailed JSON log (one JSON object per line)
+        self.json_filename = f"ai_detailed_{timestamp}.ndjson"
+        self._ndjson_fh = open(os.path.join(self.logs_dir, self.json_filename), 'a', encoding='utf-8')
+    
+    def _close_logs(self):
+        """Close the log files opened for this run."""
+        for fh in (self._log_fh, self._ndjson_fh):
+            if fh is not None:
+                fh.close()
+        self._log_fh = None
+        self._ndjson_fh = None
     
     def display_validation_summary(self, tracks: List[Dict[str, Any]]):
         """Display a summary of AI validation results."""
@@ -364,12 +839,15 @@ Please respond in JSON format with an array of objects, each containing:
     def filter_party_tracks(self, tracks: List[Dict[str, Any]], min_score: float = 6.0) -> List[Dict[str, Any]]:
         """Filter tracks that are suitable for parties based on AI scores."""
         
-        party_tracks = [
-            track for track in tracks 
-            if track.get('ai_party_score', 0) >= min_score
-        ]
+        # Gather scores into one column, unscored tracks count as 0
+        scores = np.fromiter(
+            (track.get('ai_party_score', 0) for track in tracks),
+            dtype=np.float64,
+            count=len(tracks)
+        )
         
-        # Sort by AI score (highest first)
-        party_tracks.sort(key=lambda x: x.get('ai_party_score', 0), reverse=True)
+        # Select and sort by AI score (highest first); stable keeps ties in input order
+        selected = np.flatnonzero(scores >= min_score)
+        order = selected[np.argsort(-scores[selected], kind='stable')]
         
-        return party_tracks 
\ No newline at end of file
+        return [tracks[i] for i in order] 
\ No newline at end of file
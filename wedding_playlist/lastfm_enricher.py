@@ -1,11 +1,21 @@
 """Last.fm metadata enricher for enhanced track analysis."""
 
 import os
+import sys
+import math
 import time
-from typing import List, Dict, Any, Optional
-import pylast
+import asyncio
+import atexit
+import hashlib
+import sqlite3
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import httpx
+import orjson
+import msgpack
 from rich.console import Console
-from rich.progress import Progress
+from .progress import create_progress
 
 # Ensure environment variables are loaded
 try:
@@ -14,69 +24,426 @@ try:
 except ImportError:
     pass  # dotenv not available, assume env vars are set manually
 
-console = Console()
+console = Console(highlight=False)
+
+LASTFM_API_URL = "https://ws.audioscrobbler.com/2.0/"
+
+# Danceability of well-known Last.fm tags (lower-case names); upbeat tags score high, chill tags low
+DANCE_TAGS = {
+    'dance': 0.9, 'electronic': 0.8, 'house': 0.9, 'techno': 0.8,
+    'disco': 0.9, 'funk': 0.8, 'pop': 0.7, 'club': 0.9,
+    'edm': 0.9, 'trance': 0.8, 'dubstep': 0.7, 'hip hop': 0.7,
+    'hip-hop': 0.7, 'rap': 0.6, 'r&b': 0.7, 'rnb': 0.7,
+    'latin': 0.8, 'reggaeton': 0.9, 'afrobeat': 0.8,
+    'upbeat': 0.8, 'energetic': 0.7, 'party': 0.8
+}
+CHILL_TAGS = {
+    'ambient': 0.1, 'chill': 0.2, 'relaxing': 0.1, 'mellow': 0.2,
+    'folk': 0.3, 'acoustic': 0.3, 'jazz': 0.4, 'classical': 0.1,
+    'instrumental': 0.2, 'ballad': 0.2, 'sad': 0.1, 'melancholy': 0.1
+}
+# Interned keys so lookups with interned tag names hit the identity fast path
+DANCEABILITY_TAG_WEIGHTS = {sys.intern(tag): weight for tag, weight in {**CHILL_TAGS, **DANCE_TAGS}.items()}
+
+# Last.fm error code for an unknown track or artist
+LASTFM_NOT_FOUND = 6
+
+# How long cached Last.fm lookups stay valid (seconds)
+CACHE_TTL = 7 * 86400
+NEGATIVE_CACHE_TTL = 86400
+
+# Bump when the cached metadata layout changes so stale entries are refetched
+CACHE_VERSION = 3
+
+
+class LastFMError(Exception):
+    """Error returned by the Last.fm API (e.g. track not found)."""
+    
+    def __init__(self, message: str, code: int = 0):
+        super().__init__(message)
+        self.code = code
+
+
+def _section(result: Any, key: str) -> Dict[str, Any]:
+    """Return a top-level section of a Last.fm response, or {} for failed lookups."""
+    return (result.get(key) or {}) if isinstance(result, dict) else {}
+
+
+def _as_list(items: Any) -> List[Any]:
+    """Last.fm returns a bare object instead of a list when there is a single item."""
+    if isinstance(items, list):
+        return items
+    return [items] if items else []
+
+
+def _is_transient(result: Any) -> bool:
+    """
+    Whether a lookup result is a failure worth retrying rather than a definitive answer.
+    
+    Network and decoding errors are transient, and so is every Last.fm error except
+    "not found" (e.g. 29 rate limit exceeded, 8/11/16 temporary service errors).
+    """
+    if isinstance(result, LastFMError):
+        return result.code != LASTFM_NOT_FOUND
+    return isinstance(result, Exception)
+
+
+async def _skipped() -> Dict[str, Any]:
+    """Stand-in for an optional lookup the caller opted out of."""
+    return {}
+
+
+def extract_track_metadata(track_info: Any, track_tags: Any, similar: Any) -> Dict[str, Any]:
+    """
+    Extract track-level fields from raw track.getInfo/getTopTags/getSimilar responses.
+    
+    Args:
+        track_info: Parsed track.getInfo response, or an exception if the lookup failed
+        track_tags: Parsed track.getTopTags response, or an exception
+        similar: Parsed track.getSimilar response, or an exception
+        
+    Returns:
+        Dictionary with track metadata
+    """
+    metadata = {}
+    
+    # Basic track info
+    info = _section(track_info, 'track')
+    if info:
+        metadata['playcount'] = int(info.get('playcount') or 0)
+        metadata['listeners'] = int(info.get('listeners') or 0)
+        
+        # Track duration if available
+        duration = int(info.get('duration') or 0)
+        if duration:
+            metadata['duration_seconds'] = duration / 1000
+    
+    # Top tags (genres)
+    tags = _as_list(_section(track_tags, 'toptags').get('tag'))[:10]
+    # Tag names are a small recurring vocabulary: lower-case and intern them once here
+    metadata['tags'] = [
+        {'name': sys.intern(tag['name'].lower()), 'weight': int(tag.get('count') or 0)} for tag in tags
+    ]
+    metadata['genres'] = [tag['name'] for tag in tags[:5]]
+    
+    # Similar tracks
+    metadata['similar_tracks'] = [
+        {'artist': sim.get('artist', {}).get('name', ''), 'track': sim['name'], 'match': float(sim.get('match') or 0)}
+        for sim in _as_list(_section(similar, 'similartracks').get('track'))
+    ]
+    
+    return metadata
+
+
+def extract_artist_metadata(artist_info: Any, artist_tags: Any, similar_artists: Any) -> Dict[str, Any]:
+    """
+    Extract artist-level fields from raw artist.getInfo/getTopTags/getSimilar responses.
+    
+    Args:
+        artist_info: Parsed artist.getInfo response, or an exception if the lookup failed
+        artist_tags: Parsed artist.getTopTags response, or an exception
+        similar_artists: Parsed artist.getSimilar response, or an exception
+        
+    Returns:
+        Dictionary with artist metadata
+    """
+    stats = _section(artist_info, 'artist').get('stats') or {}
+    
+    return {
+        'artist_info': {
+            'playcount': int(stats.get('playcount') or 0),
+            'listeners': int(stats.get('listeners') or 0)
+        } if stats else {},
+        'artist_tags': [tag['name'] for tag in _as_list(_section(artist_tags, 'toptags').get('tag'))[:5]],
+        'similar_artists': [
+            {'name': sim['name'], 'match': float(sim.get('match') or 0)}
+            for sim in _as_list(_section(similar_artists, 'similarartists').get('artist'))
+        ]
+    }
+
+
+def format_lastfm_for_ai(lastfm: Dict[str, Any]) -> str:
+    """
+    Format Last.fm metadata as the " | "-separated fields shown to the AI.
+    
+    Args:
+        lastfm: Last.fm metadata dictionary (may be empty)
+        
+    Returns:
+        Formatted string, or "" when there is nothing to show
+    """
+    if not lastfm:
+        return ""
+    
+    parts = []
+    
+    # Add Last.fm popularity metrics
+    playcount = lastfm.get('playcount', 0)
+    if playcount > 0:
+        parts.append(f"Last.fm plays: {playcount:,}")
+    
+    listeners = lastfm.get('listeners', 0)
+    if listeners > 0:
+        parts.append(f"Last.fm listeners: {listeners:,}")
+    
+    # Add genres/tags from Last.fm
+    genres = lastfm.get('genres')
+    if genres:
+        parts.append(f"Genres: {', '.join(genres[:3])}")  # Top 3 genres
+    
+    # Add artist popularity from Last.fm
+    artist_listeners = lastfm.get('artist_info', {}).get('listeners', 0)
+    if artist_listeners > 0:
+        parts.append(f"Artist listeners: {artist_listeners:,}")
+    
+    # Add artist style tags
+    artist_tags = lastfm.get('artist_tags')
+    if artist_tags:
+        parts.append(f"Artist style: {', '.join(artist_tags[:2])}")  # Top 2 artist tags
+    
+    # Add similar tracks for context
+    similar_tracks = lastfm.get('similar_tracks')
+    if similar_tracks:
+        similar_str = ', '.join([f"{s['artist']} - {s['track']}" for s in similar_tracks[:2]])
+        parts.append(f"Similar to: {similar_str}")
+    
+    return " | ".join(parts)
+
+
+@lru_cache(maxsize=1)
+def _shared_client() -> httpx.AsyncClient:
+    """One HTTP/2 client per process so keep-alive connections outlive individual enrichers."""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        timeout=10.0
+    )
+
+
+@lru_cache(maxsize=1)
+def _shared_runner() -> asyncio.Runner:
+    """Event loop reused across enrichment runs; the shared client's connections are bound to it."""
+    runner = asyncio.Runner()
+    atexit.register(_close_shared, runner)
+    return runner
+
+
+def _close_shared(runner: asyncio.Runner):
+    """Close the shared client (if it was ever created) and its event loop at exit."""
+    if _shared_client.cache_info().currsize:
+        runner.run(_shared_client().aclose())
+    runner.close()
+
+
+class RateLimiter:
+    """Async token bucket allowing max_rate requests per time_period, shared by all workers."""
+    
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        """Initialize the bucket full, so an initial burst of max_rate requests goes out at once."""
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self.tokens = float(max_rate)
+        self.last_refill = time.monotonic()
+    
+    async def __aenter__(self) -> "RateLimiter":
+        """Wait for a token and spend it."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.max_rate, self.tokens + (now - self.last_refill) * self.max_rate / self.time_period)
+            self.last_refill = now
+            
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return self
+            
+            # Sleep exactly until the next token is available
+            await asyncio.sleep((1 - self.tokens) * self.time_period / self.max_rate)
+    
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        pass
 
 
 class LastFMEnricher:
     """Enriches track metadata using Last.fm API."""
     
-    def __init__(self):
-        """Initialize the Last.fm enricher."""
-        # Get Last.fm API credentials
-        api_key = os.getenv('LASTFM_API_KEY')
-        if not api_key:
+    def __init__(self, max_concurrency: int = 5, requests_per_second: float = 5.0):
+        """
+        Initialize the Last.fm enricher.
+        
+        Args:
+            max_concurrency: Maximum number of Last.fm requests in flight at once
+            requests_per_second: Request rate to stay under (Last.fm allows 5 per second)
+        """
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.progress_step = 5
+        self._client = None
+        self.fetch_similar = False
+        self.fetch_artist_similar = False
+        
+        # Resolved artist metadata kept in memory across runs (least recently used evicted)
+        self.artist_cache_size = 1024
+        self._artist_lru = OrderedDict()
+        
+        # Get Last.fm API credentials (read-only calls, no authentication needed)
+        self.api_key = os.getenv('LASTFM_API_KEY')
+        if not self.api_key:
             console.print("⚠️ LASTFM_API_KEY not found - Last.fm enrichment will be skipped")
-            self.network = None
             return
         
-        try:
-            # Initialize Last.fm network (read-only, no authentication needed)
-            self.network = pylast.LastFMNetwork(api_key=api_key)
-            console.print("✅ Last.fm API initialized successfully")
-        except Exception as e:
-            console.print(f"❌ Failed to initialize Last.fm API: {e}")
-            self.network = None
+        console.print("✅ Last.fm API initialized successfully")
+        
+        # Persistent cache of Last.fm lookups so re-runs only fetch new tracks
+        self.cache_path = "output/lastfm_cache.sqlite"
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        self.cache = sqlite3.connect(self.cache_path)
+        self.cache.execute(
+            "CREATE TABLE IF NOT EXISTS lastfm_cache "
+            "(key TEXT PRIMARY KEY, payload BLOB, expires_at REAL)"
+        )
+        self.cache.commit()
+        self.cache_hits = 0
     
-    def enrich_tracks(self, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def enrich_tracks(self, tracks: List[Dict[str, Any]], *, fetch_similar: bool = False,
+                      fetch_artist_similar: bool = False) -> List[Dict[str, Any]]:
         """
         Enrich tracks with Last.fm metadata.
         
         Args:
             tracks: List of track dictionaries from Spotify
+            fetch_similar: Also look up similar tracks (one extra call per track)
+            fetch_artist_similar: Also look up similar artists (one extra call per artist)
             
         Returns:
-            List of tracks enriched with Last.fm metadata
+            The same track dictionaries, each with a 'lastfm' entry added in place
         """
-        if not self.network:
+        if not self.api_key:
             console.print("⚠️ Last.fm API not available - skipping enrichment")
             return tracks
         
         console.print(f"🎵 Enriching {len(tracks)} tracks with Last.fm metadata...")
         
-        enriched_tracks = []
+        self.fetch_similar = fetch_similar
+        self.fetch_artist_similar = fetch_artist_similar
+        enriched_tracks = _shared_runner().run(self._enrich_all(tracks))
         
-        with Progress() as progress:
+        console.print(f"✅ Enriched {len(enriched_tracks)} tracks with Last.fm data ({self.cache_hits} from cache)")
+        return enriched_tracks
+    
+    async def __aenter__(self) -> "LastFMEnricher":
+        """Attach the process-wide HTTP/2 client that multiplexes all Last.fm calls."""
+        self._client = _shared_client()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        """Detach from the HTTP client; it stays open for later runs and closes at exit."""
+        self._client = None
+    
+    async def _enrich_all(self, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Enrich all tracks concurrently over one shared HTTP client."""
+        
+        # Cap redraws and only report every few tracks to keep console overhead low
+        with create_progress(console, refresh_per_second=4) as progress:
             task = progress.add_task("Enriching with Last.fm...", total=len(tracks))
+            pending_updates = 0
             
-            for track in tracks:
-                enriched_track = track.copy()
-                lastfm_data = self._get_lastfm_metadata(track['name'], track['artist'])
-                
-                if lastfm_data:
-                    enriched_track['lastfm'] = lastfm_data
-                else:
-                    enriched_track['lastfm'] = {}
-                
-                enriched_tracks.append(enriched_track)
-                progress.update(task, advance=1)
-                
-                # Rate limiting - Last.fm allows 5 requests per second
-                time.sleep(0.2)
-        
-        console.print(f"✅ Enriched {len(enriched_tracks)} tracks with Last.fm data")
-        return enriched_tracks
+            def report(count: int):
+                nonlocal pending_updates
+                pending_updates += count
+                if pending_updates >= self.progress_step:
+                    progress.update(
+                        task,
+                        advance=pending_updates,
+                        description=f"Enriching with Last.fm ({self.cache_hits} cached)..."
+                    )
+                    pending_updates = 0
+            
+            async for _ in self.enrich_stream(tracks):
+                report(1)
+            
+            # Flush whatever is left below the reporting step
+            progress.update(
+                task,
+                advance=pending_updates,
+                description=f"Enriching with Last.fm ({self.cache_hits} cached)..."
+            )
+        
+        return tracks
+    
+    async def enrich_stream(self, tracks: List[Dict[str, Any]], max_pending: int = 32) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Enrich tracks concurrently, yielding each one as soon as its Last.fm data is attached.
+        
+        Lets a downstream consumer start on early tracks while later lookups are still in flight.
+        
+        Args:
+            tracks: List of track dictionaries from Spotify (updated in place)
+            max_pending: How many finished tracks may wait for the consumer before lookups pause
+            
+        Yields:
+            Track dictionaries with a 'lastfm' entry, in completion order
+        """
+        if not self.api_key:
+            console.print("⚠️ Last.fm API not available - skipping enrichment")
+            return
+        
+        # Created per run so they never outlive the run that uses them
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._limiter = RateLimiter(self.requests_per_second, 1.0)
+        self._artist_bundles = {}
+        self.cache_hits = 0
+        
+        queue = asyncio.Queue(maxsize=max_pending)
+        
+        async def enrich(track: Dict[str, Any]):
+            # Attach in place rather than copying every track dict
+            lastfm_data = await self._get_lastfm_metadata(track['name'], track['artist'])
+            track['lastfm'] = lastfm_data if lastfm_data else {}
+            # Format once here so every prompt built later reuses the same string
+            track['lastfm_ai_string'] = format_lastfm_for_ai(track['lastfm'])
+            await queue.put(track)
+        
+        async def produce():
+            try:
+                await asyncio.gather(*(enrich(track) for track in tracks))
+            except Exception:
+                # Still wake the consumer so it can surface the error
+                await queue.put(None)
+                raise
+            await queue.put(None)
+        
+        async with self:
+            producer = asyncio.create_task(produce())
+            try:
+                while (track := await queue.get()) is not None:
+                    yield track
+                await producer
+            finally:
+                # Artist lookups run as their own tasks on the shared loop; stop any still in flight
+                # when the stream is closed early so none outlive the run
+                pending = [producer, *(bundle for bundle in self._artist_bundles.values() if not bundle.done())]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                # One commit per run instead of one blocking fsync per track
+                self.cache.commit()
+    
+    async def _call(self, method: str, **params) -> Dict[str, Any]:
+        """Call a Last.fm API method, holding a concurrency slot and a rate-limit token."""
+        async with self._semaphore, self._limiter:
+            response = await self._client.get(LASTFM_API_URL, params={
+                'method': method,
+                'api_key': self.api_key,
+                'format': 'json',
+                **params
+            })
+        
+        data = orjson.loads(response.content)
+        if 'error' in data:
+            raise LastFMError(data.get('message', f"error {data['error']}"), data['error'])
+        return data
     
-    def _get_lastfm_metadata(self, track_name: str, artist_name: str) -> Optional[Dict[str, Any]]:
+    async def _get_lastfm_metadata(self, track_name: str, artist_name: str) -> Optional[Dict[str, Any]]:
         """
         Get metadata for a single track from Last.fm.
         
@@ -87,138 +454,141 @@ class LastFMEnricher:
         Returns:
             Dictionary with Last.fm metadata or None if not found
         """
+        cache_key = self._cache_key(artist_name, track_name)
+        found, cached = self._load_cached(cache_key)
+        if found:
+            self.cache_hits += 1
+            return cached
+        
         try:
-            # Get track object from Last.fm
-            track = self.network.get_track(artist_name, track_name)
+            # Probe with track.getInfo first so unknown tracks cost one call instead of six
+            track_params = {'artist': artist_name, 'track': track_name}
+            try:
+                track_info = await self._call('track.getInfo', **track_params)
+            except LastFMError as e:
+                console.print(f"⚠️ Last.fm error for '{track_name}' by '{artist_name}': {e}", style="dim")
+                if e.code == LASTFM_NOT_FOUND:
+                    # Unknown track: skip the other lookups and remember the miss for a shorter time
+                    self._store_cached(cache_key, None, NEGATIVE_CACHE_TTL)
+                    return None
+                # Rate limit or temporary service error; try the remaining lookups, result isn't cached
+                track_info = e
+            except (httpx.HTTPError, ValueError) as e:
+                # Network or decoding failure; still try the remaining lookups
+                track_info = e
             
-            # Collect metadata
-            metadata = {}
+            # Fire the remaining track lookups together with the (shared) artist lookups
+            track_tags, similar, artist_bundle = await asyncio.gather(
+                self._call('track.getTopTags', **track_params),
+                self._call('track.getSimilar', limit=5, **track_params) if self.fetch_similar else _skipped(),
+                self._get_artist_bundle(artist_name),
+                return_exceptions=True
+            )
             
-            # Get basic track info
-            try:
-                track_info = track.get_info()
-                if track_info:
-                    metadata['playcount'] = getattr(track_info, 'playcount', 0)
-                    metadata['listeners'] = getattr(track_info, 'listeners', 0)
-                    
-                    # Get track duration if available
-                    duration = getattr(track_info, 'duration', None)
-                    if duration:
-                        metadata['duration_seconds'] = int(duration) / 1000
-            except Exception:
-                pass
+            artist_metadata, artist_transient_failure = artist_bundle
             
-            # Get top tags (genres)
-            try:
-                tags = track.get_top_tags(limit=10)
-                if tags:
-                    metadata['tags'] = [
-                        {
-                            'name': tag.item.name,
-                            'weight': tag.weight
-                        }
-                        for tag in tags
-                    ]
-                    # Extract main genres
-                    metadata['genres'] = [tag.item.name for tag in tags[:5]]
-            except Exception:
-                metadata['tags'] = []
-                metadata['genres'] = []
+            # Transient failures on any lookup would leave holes, so don't cache those results
+            transient_failure = artist_transient_failure or any(
+                _is_transient(result) for result in (track_info, track_tags, similar)
+            )
             
-            # Get similar tracks
-            try:
-                similar = track.get_similar(limit=5)
-                if similar:
-                    metadata['similar_tracks'] = [
-                        {
-                            'artist': sim.item.artist.name,
-                            'track': sim.item.title,
-                            'match': sim.match
-                        }
-                        for sim in similar
-                    ]
-            except Exception:
-                metadata['similar_tracks'] = []
+            # Collect metadata in one pass over the parsed JSON
+            metadata = extract_track_metadata(track_info, track_tags, similar)
             
-            # Get artist info
-            try:
-                artist = track.artist
-                artist_info = artist.get_info()
-                if artist_info:
-                    metadata['artist_info'] = {
-                        'playcount': getattr(artist_info, 'playcount', 0),
-                        'listeners': getattr(artist_info, 'listeners', 0)
-                    }
-                
-                # Get artist tags
-                artist_tags = artist.get_top_tags(limit=5)
-                if artist_tags:
-                    metadata['artist_tags'] = [tag.item.name for tag in artist_tags]
-                
-                # Get similar artists
-                similar_artists = artist.get_similar(limit=3)
-                if similar_artists:
-                    metadata['similar_artists'] = [
-                        {
-                            'name': sim.item.name,
-                            'match': sim.match
-                        }
-                        for sim in similar_artists
-                    ]
-            except Exception:
-                metadata['artist_info'] = {}
-                metadata['artist_tags'] = []
-                metadata['similar_artists'] = []
+            # Merge artist info fetched once per artist
+            metadata.update(artist_metadata)
+            
+            if not transient_failure:
+                self._store_cached(cache_key, metadata, CACHE_TTL)
             
             return metadata if metadata else None
             
-        except pylast.WSError as e:
-            # Track not found or API error
-            console.print(f"⚠️ Last.fm error for '{track_name}' by '{artist_name}': {e}", style="dim")
-            return None
         except Exception as e:
             console.print(f"⚠️ Unexpected error for '{track_name}' by '{artist_name}': {e}", style="dim")
             return None
     
-    def format_lastfm_data_for_ai(self, track: Dict[str, Any]) -> str:
+    def _get_artist_bundle(self, artist_name: str) -> "asyncio.Future[Tuple[Dict[str, Any], bool]]":
+        """Return the shared lookup for an artist, starting it on first request."""
+        bundle = self._artist_bundles.get(artist_name)
+        if bundle is None:
+            bundle = asyncio.ensure_future(self._fetch_artist_bundle(artist_name))
+            self._artist_bundles[artist_name] = bundle
+        return bundle
+    
+    async def _fetch_artist_bundle(self, artist_name: str) -> Tuple[Dict[str, Any], bool]:
         """
-        Format Last.fm metadata for AI consumption.
+        Fetch artist-level metadata, once per artist per run unless already held in memory.
         
         Args:
-            track: Track dictionary with Last.fm metadata
+            artist_name: Name of the artist
             
         Returns:
-            Formatted string with Last.fm data for AI analysis
+            Tuple of (artist metadata fields, whether a lookup failed transiently)
         """
-        lastfm = track.get('lastfm', {})
-        if not lastfm:
-            return ""
-        
-        parts = []
+        lru_key = (artist_name, self.fetch_artist_similar)
+        cached = self._artist_lru.get(lru_key)
+        if cached is not None:
+            self._artist_lru.move_to_end(lru_key)
+            return cached, False
         
-        # Add popularity metrics
-        if 'playcount' in lastfm and lastfm['playcount'] > 0:
-            parts.append(f"Last.fm plays: {lastfm['playcount']:,}")
+        artist_params = {'artist': artist_name}
+        artist_info, artist_tags, similar_artists = await asyncio.gather(
+            self._call('artist.getInfo', **artist_params),
+            self._call('artist.getTopTags', **artist_params),
+            self._call('artist.getSimilar', limit=3, **artist_params) if self.fetch_artist_similar else _skipped(),
+            return_exceptions=True
+        )
+        transient_failure = any(_is_transient(result) for result in (artist_info, artist_tags, similar_artists))
         
-        if 'listeners' in lastfm and lastfm['listeners'] > 0:
-            parts.append(f"Listeners: {lastfm['listeners']:,}")
+        metadata = extract_artist_metadata(artist_info, artist_tags, similar_artists)
         
-        # Add genres/tags
-        if 'genres' in lastfm and lastfm['genres']:
-            genres_str = ', '.join(lastfm['genres'][:3])  # Top 3 genres
-            parts.append(f"Genres: {genres_str}")
+        if not transient_failure:
+            self._artist_lru[lru_key] = metadata
+            if len(self._artist_lru) > self.artist_cache_size:
+                self._artist_lru.popitem(last=False)
         
-        # Add artist popularity
-        artist_info = lastfm.get('artist_info', {})
-        if 'listeners' in artist_info and artist_info['listeners'] > 0:
-            parts.append(f"Artist listeners: {artist_info['listeners']:,}")
+        return metadata, transient_failure
+    
+    def _cache_key(self, artist_name: str, track_name: str) -> str:
+        """Hash the normalized (artist, track) pair plus the optional lookups requested."""
+        normalized = (
+            f"{artist_name.lower().strip()}\x1f{track_name.lower().strip()}"
+            f"\x1f{int(self.fetch_similar)}{int(self.fetch_artist_similar)}\x1f{CACHE_VERSION}"
+        )
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _load_cached(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (found, metadata) for an unexpired cache entry; metadata is None for known misses."""
+        row = self.cache.execute(
+            "SELECT payload FROM lastfm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, msgpack.unpackb(row[0], raw=False)
+    
+    def _store_cached(self, key: str, metadata: Optional[Dict[str, Any]], ttl: float):
+        """Stage a lookup result (or a known miss) for the given number of seconds; committed once per run."""
+        self.cache.execute(
+            "INSERT OR REPLACE INTO lastfm_cache (key, payload, expires_at) VALUES (?, ?, ?)",
+            (key, msgpack.packb(metadata, use_bin_type=True), time.time() + ttl)
+        )
+    
+    def format_lastfm_data_for_ai(self, track: Dict[str, Any]) -> str:
+        """
+        Format Last.fm metadata for AI consumption.
         
-        # Add artist tags for style context
-        if 'artist_tags' in lastfm and lastfm['artist_tags']:
-            artist_tags_str = ', '.join(lastfm['artist_tags'][:2])  # Top 2 artist tags
-            parts.append(f"Artist style: {artist_tags_str}")
+        Legacy: enrichment now stores this as track['lastfm_ai_string']; prefer reading that.
         
-        return " | ".join(parts) if parts else ""
+        Args:
+            track: Track dictionary with Last.fm metadata
+            
+        Returns:
+            Formatted string with Last.fm data for AI analysis
+        """
+        precomputed = track.get('lastfm_ai_string')
+        if precomputed is not None:
+            return precomputed
+        return format_lastfm_for_ai(track.get('lastfm', {}))
     
     def get_genre_summary(self, tracks: List[Dict[str, Any]]) -> Dict[str, int]:
         """
@@ -230,17 +600,13 @@ class LastFMEnricher:
         Returns:
             Dictionary with genre counts
         """
-        genre_counts = {}
+        genre_counts = Counter()
         
         for track in tracks:
-            lastfm = track.get('lastfm', {})
-            genres = lastfm.get('genres', [])
-            
-            for genre in genres[:3]:  # Count top 3 genres per track
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
+            genre_counts.update(track.get('lastfm', {}).get('genres', [])[:3])  # Count top 3 genres per track
         
         # Sort by frequency
-        return dict(sorted(genre_counts.items(), key=lambda x: x[1], reverse=True))
+        return dict(genre_counts.most_common())
     
     def analyze_danceability_from_tags(self, track: Dict[str, Any]) -> float:
         """
@@ -255,38 +621,22 @@ class LastFMEnricher:
         lastfm = track.get('lastfm', {})
         tags = lastfm.get('tags', [])
         
-        # Define tag weights for danceability
-        dance_tags = {
-            'dance': 0.9, 'electronic': 0.8, 'house': 0.9, 'techno': 0.8,
-            'disco': 0.9, 'funk': 0.8, 'pop': 0.7, 'club': 0.9,
-            'edm': 0.9, 'trance': 0.8, 'dubstep': 0.7, 'hip hop': 0.7,
-            'hip-hop': 0.7, 'rap': 0.6, 'r&b': 0.7, 'rnb': 0.7,
-            'latin': 0.8, 'reggaeton': 0.9, 'afrobeat': 0.8,
-            'upbeat': 0.8, 'energetic': 0.7, 'party': 0.8
-        }
-        
-        chill_tags = {
-            'ambient': 0.1, 'chill': 0.2, 'relaxing': 0.1, 'mellow': 0.2,
-            'folk': 0.3, 'acoustic': 0.3, 'jazz': 0.4, 'classical': 0.1,
-            'instrumental': 0.2, 'ballad': 0.2, 'sad': 0.1, 'melancholy': 0.1
-        }
-        
         score = 0.5  # Default neutral score
-        weight_sum = 0
+        weighted_scores = []
+        weights = []
         
         for tag_info in tags:
-            tag_name = tag_info['name'].lower()
-            tag_weight = tag_info.get('weight', 1)
-            
-            if tag_name in dance_tags:
-                score += dance_tags[tag_name] * tag_weight
-                weight_sum += tag_weight
-            elif tag_name in chill_tags:
-                score += chill_tags[tag_name] * tag_weight
-                weight_sum += tag_weight
+            tag_danceability = DANCEABILITY_TAG_WEIGHTS.get(tag_info['name'])
+            if tag_danceability is not None:
+                tag_weight = tag_info.get('weight', 1)
+                if tag_weight == 0:
+                    continue  # Contributes nothing to either sum
+                weighted_scores.append(tag_danceability * tag_weight)
+                weights.append(tag_weight)
         
         # Normalize if we found relevant tags
+        weight_sum = math.fsum(weights)
         if weight_sum > 0:
-            score = score / (weight_sum + 1)  # +1 to account for default score
+            score = (score + math.fsum(weighted_scores)) / (weight_sum + 1)  # +1 to account for default score
         
-        return max(0.0, min(1.0, score))  # Clamp to 0-1 range 
\ No newline at end of file
+        return max(0.0, min(1.0, score))  # Clamp to 0-1 range
@@ -2,25 +2,130 @@
 """Main entry point for the AI-powered wedding playlist generator."""
 
 import os
+import asyncio
 import click
+import orjson
+import numpy as np
 from datetime import datetime
+from itertools import islice
+from typing import List, Dict, Any, Tuple, TYPE_CHECKING
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Confirm, IntPrompt
 from rich.text import Text
-from rich.progress import Progress
 
 # Load environment variables first, before importing our modules
 from dotenv import load_dotenv
 load_dotenv()  # Load .env file from current directory
 
-from .spotify_client import SpotifyClient
-from .music_analyzer import MusicAnalyzer
-from .ai_validator import AIValidator
-from .playlist_generator import PlaylistGenerator
-from .lastfm_enricher import LastFMEnricher
+# Heavy modules (pandas, scikit-learn, spotipy) are imported inside the commands that use them
+from ._clients import get_spotify_client, get_ai_validator, get_playlist_generator, get_lastfm_enricher
+from .progress import create_progress
 
-console = Console()
+if TYPE_CHECKING:
+    from .spotify_client import SpotifyClient
+
+# Skip Rich's per-print regex highlighting; output is styled explicitly where needed
+console = Console(highlight=False)
+
+
+async def _fetch_seed_tracks(spotify_client: "SpotifyClient", tracks: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Fetch top tracks and saved tracks, skipping the second endpoint when it isn't needed.
+    
+    Args:
+        spotify_client: Authenticated Spotify client
+        tracks: Number of tracks requested on the command line
+        
+    Returns:
+        Tuple of (top tracks, saved tracks)
+    """
+    # Small runs fit in one top-tracks page; only fall back to saved tracks to fill the gap
+    if tracks <= 50:
+        top_tracks = await asyncio.to_thread(spotify_client.get_user_top_tracks, limit=tracks)
+        unique_top = _dedup_by_id(top_tracks, tracks)
+        missing = tracks - len(unique_top)
+        if missing <= 0:
+            return top_tracks, []
+        # Saved tracks may repeat top tracks and are deduplicated afterwards, so over-fetch
+        # by the largest possible overlap to still fill the run
+        saved_tracks = await asyncio.to_thread(
+            spotify_client.get_saved_tracks, limit=missing + len(unique_top)
+        )
+        return top_tracks, saved_tracks
+    
+    limit = min(50, tracks//2)
+    
+    # Resolve the OAuth token up front so both threads don't start a login flow
+    spotify_client.sp.auth_manager.get_access_token(as_dict=False)
+    
+    # Both calls are blocking HTTP round-trips; run them in threads side by side
+    top_tracks, saved_tracks = await asyncio.gather(
+        asyncio.to_thread(spotify_client.get_user_top_tracks, limit=limit),
+        asyncio.to_thread(spotify_client.get_saved_tracks, limit=limit)
+    )
+    return top_tracks, saved_tracks
+
+
+def _dedup_by_id(tracks: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Keep the first occurrence of each track ID, stopping once limit tracks are collected.
+    
+    Args:
+        tracks: Tracks in priority order (may contain duplicates or missing IDs)
+        limit: Maximum number of unique tracks to return
+        
+    Returns:
+        List of unique tracks
+    """
+    seen = set()
+    unique_tracks = []
+    for track in tracks:
+        track_id = track.get('id')
+        if track_id and track_id not in seen:
+            seen.add(track_id)
+            unique_tracks.append(track)
+            if len(unique_tracks) == limit:
+                break
+    return unique_tracks
+
+
+def _preflight_credentials(required: List[str], optional: Dict[str, str] = None) -> None:
+    """
+    Check credentials before any network work so a missing key fails in milliseconds.
+    
+    Args:
+        required: Environment variables the command cannot run without
+        optional: Environment variables mapped to the step that is skipped without them
+    """
+    for var, skipped_step in (optional or {}).items():
+        if not os.getenv(var):
+            console.print(f"⚠️ {var} not set - {skipped_step} will be skipped")
+    
+    missing = [var for var in required if not os.getenv(var)]
+    if missing:
+        console.print(f"❌ Missing credentials: {', '.join(missing)}")
+        console.print("💡 Run 'uv run python main.py setup' to configure them")
+        raise click.Abort()
+
+
+def _summary_stats(tracks: List[Dict[str, Any]]) -> Tuple[float, float]:
+    """
+    Compute total duration and average AI score with one NumPy reduction each.
+    
+    Args:
+        tracks: List of track dictionaries
+        
+    Returns:
+        Tuple of (total duration in minutes, average AI party score)
+    """
+    if not tracks:
+        return 0.0, 0.0
+    
+    count = len(tracks)
+    durations_ms = np.fromiter((t.get('duration_ms') or 0 for t in tracks), dtype=np.int64, count=count)
+    scores = np.fromiter((t.get('ai_party_score') or 0 for t in tracks), dtype=np.float64, count=count)
+    return float(durations_ms.sum()) / (1000 * 60), float(scores.mean())
 
 
 @click.group()
@@ -41,7 +146,9 @@ def main():
 @click.option('--create-spotify', '-sp', is_flag=True, help='Create Spotify playlist')
 @click.option('--output-dir', '-o', default='output', help='Output directory for files')
 @click.option('--skip-lastfm', is_flag=True, help='Skip Last.fm metadata enrichment')
-def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm):
+@click.option('--batch-api', is_flag=True, help='Score tracks via the offline Batch API (cheaper, can take hours)')
+@click.option('--use-pca', is_flag=True, help='Reduce features with PCA before clustering')
+def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm, batch_api, use_pca):
     """🎉 Generate AI-curated wedding party playlist from your Spotify favorites."""
     
     console.print(Panel.fit(
@@ -56,43 +163,47 @@ def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm
         style="bold cyan"
     ))
     
+    optional_credentials = {'DEEPSEEK_API_KEY': "AI validation"}
+    if not skip_lastfm:
+        optional_credentials['LASTFM_API_KEY'] = "Last.fm enrichment"
+    _preflight_credentials(['SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET'], optional_credentials)
+    
     try:
         # Step 1: Initialize clients
         console.print("\n🔧 Initializing clients...")
-        spotify_client = SpotifyClient()
-        analyzer = MusicAnalyzer()
-        ai_validator = AIValidator()
-        generator = PlaylistGenerator()
+        from .music_analyzer import MusicAnalyzer
+        spotify_client = get_spotify_client()
+        analyzer = MusicAnalyzer(use_pca=use_pca)
+        ai_validator = get_ai_validator()
+        generator = get_playlist_generator()
         
         # Initialize Last.fm enricher (optional)
         lastfm_enricher = None
         if not skip_lastfm:
-            lastfm_enricher = LastFMEnricher()
+            lastfm_enricher = get_lastfm_enricher()
         
         # Step 2: Extract music from Spotify
         console.print(f"\n📥 Extracting {tracks} favorite tracks from Spotify...")
         
         # Get both top tracks and saved tracks
-        top_tracks = spotify_client.get_user_top_tracks(limit=min(50, tracks//2))
-        saved_tracks = spotify_client.get_saved_tracks(limit=min(50, tracks//2))
+        top_tracks, saved_tracks = asyncio.run(_fetch_seed_tracks(spotify_client, tracks))
         
         # Remove duplicates and get the final list
         all_tracks = top_tracks + saved_tracks
-        # Improved deduplication with debug info
-        unique_tracks = list({track['id']: track for track in all_tracks if track.get('id')}.values())[:tracks]
+        unique_tracks = _dedup_by_id(all_tracks, tracks)
         console.print(f"📊 Deduplicated to {len(unique_tracks)} unique tracks")
         
         # Step 3: Enrich with Last.fm metadata (optional)
-        if lastfm_enricher and lastfm_enricher.network:
+        if lastfm_enricher and lastfm_enricher.api_key:
             console.print("\n🎵 Enriching tracks with Last.fm metadata...")
             unique_tracks = lastfm_enricher.enrich_tracks(unique_tracks)
             
             # Display genre summary
             genre_summary = lastfm_enricher.get_genre_summary(unique_tracks)
             if genre_summary:
-                console.print("\n📊 Top genres found:")
-                for genre, count in list(genre_summary.items())[:10]:
-                    console.print(f"  • {genre}: {count} tracks")
+                console.print("\n📊 Top genres found:\n" + "\n".join(
+                    f"  • {genre}: {count} tracks" for genre, count in islice(genre_summary.items(), 10)
+                ))
         else:
             console.print("⚠️ Note: Using metadata-based clustering (Spotify audio features deprecated)")
         
@@ -106,7 +217,7 @@ def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm
         # Step 5: AI validation
         console.print(f"\n🤖 Starting AI validation with DeepSeek...")
         tracks_list = df_clustered.to_dict('records')
-        validated_tracks = ai_validator.validate_tracks_for_party(tracks_list)
+        validated_tracks = ai_validator.validate_tracks_for_party(tracks_list, use_batch_api=batch_api)
         
         # Display AI validation summary
         ai_validator.display_validation_summary(validated_tracks)
@@ -119,14 +230,10 @@ def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm
         # Step 7: Generate outputs
         console.print("\n📄 Generating outputs...")
         
-        # Text playlist
-        txt_file = generator.generate_txt_playlist(party_tracks)
-        
-        # JSON playlist
-        json_file = generator.generate_json_playlist(party_tracks)
-        
-        # Analysis report
-        report_file = generator.generate_analysis_report(validated_tracks, cluster_analysis)
+        # Text playlist, JSON playlist and analysis report
+        txt_file, json_file, report_file = generator.generate_all(
+            party_tracks, report_tracks=validated_tracks, cluster_analysis=cluster_analysis
+        )
         
         # Spotify playlist (optional)
         if create_spotify:
@@ -138,13 +245,15 @@ def generate(tracks, clusters, ai_score, create_spotify, output_dir, skip_lastfm
                     console.print(f"❌ Error creating Spotify playlist: {e}")
         
         # Summary
+        _, avg_score = _summary_stats(party_tracks)
+        
         console.print(Panel.fit(
             f"🎉 Wedding Playlist Generation Complete! 🎉\n\n"
             f"📊 Analysis:\n"
             f"• Total tracks analyzed: {len(validated_tracks)}\n"
             f"• Party-suitable tracks: {len(party_tracks)}\n"
             f"• Music style clusters: {clusters}\n"
-            f"• Average AI score: {sum(t.get('ai_party_score', 0) for t in party_tracks) / len(party_tracks):.1f}/10\n\n"
+            f"• Average AI score: {avg_score:.1f}/10\n\n"
             f"📁 Generated files:\n"
             f"• Text playlist: {txt_file}\n"
             f"• JSON data: {json_file}\n"
@@ -199,12 +308,17 @@ def setup():
     
     deepseek_key = click.prompt("Enter DeepSeek API Key", hide_input=True)
     
-    # Write to .env file
-    with open(env_file, 'w') as f:
-        f.write(f"SPOTIFY_CLIENT_ID={spotify_id}\n")
-        f.write(f"SPOTIFY_CLIENT_SECRET={spotify_secret}\n")
-        f.write(f"SPOTIFY_REDIRECT_URI=https://127.0.0.1:8888/callback\n")
-        f.write(f"DEEPSEEK_API_KEY={deepseek_key}\n")
+    # Write to .env file in one go via a temp file, so a crash never leaves it half-written
+    payload = (
+        f"SPOTIFY_CLIENT_ID={spotify_id}\n"
+        f"SPOTIFY_CLIENT_SECRET={spotify_secret}\n"
+        f"SPOTIFY_REDIRECT_URI=https://127.0.0.1:8888/callback\n"
+        f"DEEPSEEK_API_KEY={deepseek_key}\n"
+    )
+    tmp_file = env_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(payload)
+    os.replace(tmp_file, env_file)
     
     console.print(f"✅ Credentials saved to {env_file}")
     console.print("💡 Run 'uv run python main.py generate' to start generating playlists!")
@@ -214,21 +328,26 @@ def setup():
 @click.option('--tracks', '-t', default=20, help='Number of tracks to analyze (default: 20)')
 @click.option('--clusters', '-c', default=3, help='Number of music style clusters (default: 3)')
 @click.option('--skip-lastfm', is_flag=True, help='Skip Last.fm metadata enrichment')
-def analyze(tracks, clusters, skip_lastfm):
+@click.option('--use-pca', is_flag=True, help='Reduce features with PCA before clustering')
+def analyze(tracks, clusters, skip_lastfm, use_pca):
     """📊 Analyze your Spotify music without generating playlists."""
     
+    _preflight_credentials(
+        ['SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET'],
+        {} if skip_lastfm else {'LASTFM_API_KEY': "Last.fm enrichment"}
+    )
+    
     try:
-        spotify_client = SpotifyClient()
-        analyzer = MusicAnalyzer()
-        lastfm_enricher = LastFMEnricher() if not skip_lastfm else None
+        from .music_analyzer import MusicAnalyzer
+        spotify_client = get_spotify_client()
+        analyzer = MusicAnalyzer(use_pca=use_pca)
+        lastfm_enricher = get_lastfm_enricher() if not skip_lastfm else None
         
         console.print(f"\n📥 Extracting {tracks} tracks...")
-        top_tracks = spotify_client.get_user_top_tracks(limit=min(50, tracks//2))
-        saved_tracks = spotify_client.get_saved_tracks(limit=min(50, tracks//2))
+        top_tracks, saved_tracks = asyncio.run(_fetch_seed_tracks(spotify_client, tracks))
         
         all_tracks = top_tracks + saved_tracks
-        # Improved deduplication with debug info
-        unique_tracks = list({track['id']: track for track in all_tracks if track.get('id')}.values())[:tracks]
+        unique_tracks = _dedup_by_id(all_tracks, tracks)
         console.print(f"📊 Deduplicated to {len(unique_tracks)} unique tracks")
         
         # Enrich with Last.fm metadata if enabled
@@ -238,9 +357,9 @@ def analyze(tracks, clusters, skip_lastfm):
             # Display genre summary
             genre_summary = lastfm_enricher.get_genre_summary(unique_tracks)
             if genre_summary:
-                console.print("📊 Top genres found:")
-                for genre, count in list(genre_summary.items())[:5]:
-                    console.print(f"  • {genre}: {count} tracks")
+                console.print("📊 Top genres found:\n" + "\n".join(
+                    f"  • {genre}: {count} tracks" for genre, count in islice(genre_summary.items(), 5)
+                ))
         else:
             console.print("⚠️ Skipping Last.fm enrichment")
         
@@ -254,7 +373,7 @@ def analyze(tracks, clusters, skip_lastfm):
         analyzer.display_cluster_overview(cluster_analysis)
         
         # Generate analysis report
-        generator = PlaylistGenerator()
+        generator = get_playlist_generator()
         tracks_list = df_clustered.to_dict('records')
         report_file = generator.generate_analysis_report(tracks_list, cluster_analysis)
         
@@ -273,7 +392,7 @@ def test():
     
     # Test Spotify
     try:
-        spotify_client = SpotifyClient()
+        spotify_client = get_spotify_client()
         test_tracks = spotify_client.get_user_top_tracks(limit=1)
         console.print("✅ Spotify API: Connected successfully")
         
@@ -292,7 +411,7 @@ def test():
     
     # Test DeepSeek
     try:
-        ai_validator = AIValidator()
+        ai_validator = get_ai_validator()
         # Create a minimal test
         test_track = [{
             'name': 'Test Song',
@@ -303,7 +422,8 @@ def test():
             'tempo': 120,
             'popularity': 80
         }]
-        validated = ai_validator.validate_tracks_for_party(test_track)
+        # Bypass the score cache so the test always makes a real request
+        validated = ai_validator.validate_tracks_for_party(test_track, use_cache=False)
         console.print("✅ DeepSeek AI API: Connected successfully")
     except Exception as e:
         console.print(f"❌ DeepSeek AI API: {e}")
@@ -371,9 +491,8 @@ def create_playlist(playlist_file, playlist_name, public, description):
         # Load the JSON playlist
         console.print(f"📂 Loading playlist from: {playlist_file}")
         
-        import json
-        with open(playlist_file, 'r', encoding='utf-8') as f:
-            playlist_data = json.load(f)
+        with open(playlist_file, 'rb') as f:
+            playlist_data = orjson.loads(f.read())
         
         # Validate JSON structure
         if 'tracks' not in playlist_data:
@@ -387,20 +506,18 @@ def create_playlist(playlist_file, playlist_name, public, description):
         
         # Initialize Spotify client
         console.print("🔧 Connecting to Spotify...")
-        spotify_client = SpotifyClient()
+        spotify_client = get_spotify_client()
         
         # Generate playlist name if not provided
         if not playlist_name:
             original_name = metadata.get('name', 'Wedding Party Playlist')
-            from datetime import datetime
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             playlist_name = f"{original_name} - {timestamp}"
         
         # Generate description if not provided
         if not description:
             total_tracks = len(tracks)
-            total_duration = sum(track.get('duration_ms', 0) for track in tracks) / (1000 * 60)
-            avg_score = sum(track.get('ai_party_score', 0) for track in tracks) / len(tracks) if tracks else 0
+            total_duration, avg_score = _summary_stats(tracks)
             
             description = (
                 f"AI-curated wedding playlist with {total_tracks} tracks "
@@ -410,15 +527,8 @@ def create_playlist(playlist_file, playlist_name, public, description):
             )
         
         # Extract track IDs
-        track_ids = []
-        invalid_tracks = []
-        
-        for track in tracks:
-            track_id = track.get('id')
-            if track_id:
-                track_ids.append(track_id)
-            else:
-                invalid_tracks.append(track.get('name', 'Unknown'))
+        track_ids = [track['id'] for track in tracks if track.get('id')]
+        invalid_tracks = [track.get('name', 'Unknown') for track in tracks if not track.get('id')]
         
         if invalid_tracks:
             console.print(f"⚠️ Warning: {len(invalid_tracks)} tracks missing Spotify IDs")
@@ -447,11 +557,13 @@ def create_playlist(playlist_file, playlist_name, public, description):
         playlist_id = playlist['id']
         console.print(f"✅ Created playlist: {playlist_name}")
         
-        # Add tracks in batches (Spotify limit is 100 tracks per request)
+        # Add tracks in batches (Spotify limit is 100 tracks per request).
+        # Batches go out one after another on purpose: concurrent adds append in
+        # completion order and would shuffle the score-ranked playlist.
         batch_size = 100
         added_count = 0
         
-        with Progress() as progress:
+        with create_progress(console) as progress:
             task = progress.add_task("Adding tracks...", total=len(track_ids))
             
             for i in range(0, len(track_ids), batch_size):
@@ -490,7 +602,7 @@ def create_playlist(playlist_file, playlist_name, public, description):
         else:
             console.print(f"\n🎵 Playlist contains {len(tracks)} tracks. Check Spotify for full list!")
         
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         console.print("❌ Invalid JSON file format")
         raise click.Abort()
     except Exception as e:
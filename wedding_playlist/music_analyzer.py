@@ -1,25 +1,67 @@
 """Music analysis and clustering functionality."""
 
+import os
+import hashlib
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from rich.console import Console
 from rich.table import Table
 import re
 
-console = Console()
+console = Console(highlight=False)
+
+# Track-name keywords hinting at high or low energy
+HIGH_ENERGY_KEYWORDS = ('dance', 'party', 'electric', 'beat', 'club', 'remix', 'uptempo', 'energy', 'pump', 'groove')
+LOW_ENERGY_KEYWORDS = ('ballad', 'acoustic', 'slow', 'quiet', 'piano', 'soft', 'gentle', 'lullaby', 'ambient')
+
+
+def _keyword_scanner(keywords: Tuple[str, ...]) -> "re.Pattern":
+    """Compile one case-insensitive pattern that reports every keyword occurrence, overlapping ones included."""
+    return re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))", re.IGNORECASE)
+
+
+HIGH_ENERGY_SCAN = _keyword_scanner(HIGH_ENERGY_KEYWORDS)
+LOW_ENERGY_SCAN = _keyword_scanner(LOW_ENERGY_KEYWORDS)
+
+# Era labels by average release year: before 1980, 1980s, ..., 2020 onwards
+ERA_EDGES = np.array([1980, 1990, 2000, 2010, 2020])
+ERA_LABELS = np.array(["Classic oldies", "80s", "90s", "2000s", "2010s", "Recent releases"])
+
+
+def _truncated_join(items: Iterable[str], max_length: int = 50, separator: str = ", ") -> str:
+    """Join items, stopping as soon as the result exceeds max_length and marking the cut with '...'."""
+    parts = []
+    length = 0
+    for item in items:
+        length += len(item) + (len(separator) if parts else 0)
+        parts.append(item)
+        if length > max_length:
+            return separator.join(parts)[:max_length] + "..."
+    return separator.join(parts)
 
 
 class MusicAnalyzer:
     """Analyzes and clusters music based on track metadata (audio features deprecated by Spotify)."""
     
-    def __init__(self):
-        """Initialize the music analyzer."""
-        self.scaler = StandardScaler()
-        self.pca = PCA(n_components=3)
+    def __init__(self, use_pca: bool = False):
+        """
+        Initialize the music analyzer.
+        
+        Args:
+            use_pca: Reduce features with PCA before clustering (only worthwhile for many features)
+        """
+        self.use_pca = use_pca
+        self.cache_dir = "output/cluster_cache"
+        # Most cached label files kept; the least recently used beyond this are deleted
+        self.cache_limit = 32
+        
+        # Above this many tracks, fit with mini-batches instead of full Lloyd iterations
+        self.minibatch_threshold = 2000
+        # Fitted standardization, PCA and K-means from the last fresh fit; None after a cache hit
+        self.feature_mean = None
+        self.feature_std = None
+        self.pca_components = None
         self.kmeans = None
         # Use available metadata features instead of audio features
         self.feature_columns = [
@@ -38,51 +80,49 @@ class MusicAnalyzer:
         """
         console.print("📊 Preparing music data for analysis (using metadata only)...")
         
-        # Extract useful features from track metadata
-        enhanced_tracks = []
-        for track in tracks:
-            enhanced_track = track.copy()
-            
-            # Extract release year from album release date if available
-            try:
-                if 'album' in track and 'release_date' in track['album']:
-                    release_date = track['album']['release_date']
-                    enhanced_track['release_year'] = int(release_date[:4])
-                else:
-                    enhanced_track['release_year'] = 2020  # Default
-            except:
-                enhanced_track['release_year'] = 2020
-            
-            # Add artist popularity (use track popularity as proxy)
-            enhanced_track['artist_popularity'] = track.get('popularity', 50)
-            
-            # Estimate genre diversity based on artist name patterns
-            enhanced_track['name_energy'] = self._estimate_energy_from_name(track.get('name', ''))
-            
-            enhanced_tracks.append(enhanced_track)
+        # Build the frame straight from the track dicts; derived columns are added column-wise
+        df = pd.DataFrame(tracks)
         
-        df = pd.DataFrame(enhanced_tracks)
+        # Extract release year from album release date if available (default 2020)
+        if 'album' in df.columns:
+            release_dates = pd.Series(
+                [album.get('release_date', '') if isinstance(album, dict) else '' for album in df['album']],
+                index=df.index, dtype=object
+            )
+            df['release_year'] = pd.to_numeric(release_dates.str[:4], errors='coerce').fillna(2020).astype(int)
+        else:
+            df['release_year'] = 2020
+        
+        # Add artist popularity (use track popularity as proxy)
+        df['artist_popularity'] = df['popularity'] if 'popularity' in df.columns else 50
+        
+        # Estimate energy from track names in one pass over the whole column
+        if 'name' in df.columns:
+            df['name_energy'] = self._estimate_energy_batch(df['name'])
         console.print(f"✅ Prepared metadata for {len(df)} tracks")
         return df
     
-    def _estimate_energy_from_name(self, track_name: str) -> float:
-        """Estimate energy level from track name patterns."""
-        track_name = track_name.lower()
-        
-        high_energy_keywords = ['dance', 'party', 'electric', 'beat', 'club', 'remix', 'uptempo', 'energy', 'pump', 'groove']
-        low_energy_keywords = ['ballad', 'acoustic', 'slow', 'quiet', 'piano', 'soft', 'gentle', 'lullaby', 'ambient']
+    def _estimate_energy_batch(self, names: pd.Series) -> np.ndarray:
+        """
+        Estimate energy levels for many track names at once.
         
-        energy_score = 0.5  # baseline
+        Each distinct keyword found in a name moves its score 0.1 from the 0.5 baseline.
         
-        for keyword in high_energy_keywords:
-            if keyword in track_name:
-                energy_score += 0.1
+        Args:
+            names: Series of track names
+            
+        Returns:
+            Array of energy estimates (0.0 - 1.0), one per name
+        """
+        high_hits = np.zeros(len(names), dtype=np.int32)
+        low_hits = np.zeros(len(names), dtype=np.int32)
         
-        for keyword in low_energy_keywords:
-            if keyword in track_name:
-                energy_score -= 0.1
+        # One compiled scan per name and keyword class; matching ignores case, so names aren't lowered
+        for i, name in enumerate(names.fillna('').astype(str)):
+            high_hits[i] = len({match.lower() for match in HIGH_ENERGY_SCAN.findall(name)})
+            low_hits[i] = len({match.lower() for match in LOW_ENERGY_SCAN.findall(name)})
         
-        return max(0.0, min(1.0, energy_score))
+        return np.clip(0.5 + 0.1 * (high_hits - low_hits), 0.0, 1.0)
     
     def cluster_tracks(self, df: pd.DataFrame, n_clusters: int = 5) -> Tuple[pd.DataFrame, Dict[str, Any]]:
         """
@@ -97,36 +137,36 @@ class MusicAnalyzer:
         """
         console.print(f"🎯 Clustering tracks into {n_clusters} music styles (using metadata)...")
         
-        # Add estimated features
-        df['name_energy'] = df['name'].apply(self._estimate_energy_from_name)
+        # Add estimated features (prepare_data normally has already)
+        if 'name_energy' not in df.columns:
+            df['name_energy'] = self._estimate_energy_batch(df['name'])
         
         # Select and clean feature columns
         available_features = [col for col in self.feature_columns if col in df.columns]
         available_features.append('name_energy')
         
-        feature_data = df[available_features].copy()
-        feature_data = feature_data.dropna()
-        
-        if len(feature_data) == 0:
+        # Keep rows with every feature present, selected with one boolean mask
+        complete = df[available_features].notna().all(axis=1).to_numpy()
+        if not complete.any():
             raise ValueError("No valid metadata found for clustering")
         
-        # Normalize features
-        features_scaled = self.scaler.fit_transform(feature_data)
-        
-        # Apply PCA for dimensionality reduction (adjust components based on data size)
-        n_components = min(3, len(feature_data), len(available_features))
-        if n_components < 1:
-            n_components = 1
-        
-        self.pca = PCA(n_components=n_components)
-        features_pca = self.pca.fit_transform(features_scaled)
-        
-        # Perform K-means clustering
-        self.kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        cluster_labels = self.kmeans.fit_predict(features_pca)
+        df_clustered = df.loc[complete].copy()
+        features = df_clustered[available_features].to_numpy(dtype=np.float32)
+        
+        # Same tracks, features and settings give the same labels; reuse them from disk
+        cache_key = self._cluster_cache_key(df_clustered, features, available_features, n_clusters)
+        cache_file = os.path.join(self.cache_dir, f"cluster_{cache_key}.npy")
+        cluster_labels = self._load_cached_labels(cache_file, len(df_clustered))
+        if cluster_labels is not None:
+            # No model was fit for these labels, so don't expose one from an unrelated run
+            self.feature_mean = self.feature_std = self.pca_components = self.kmeans = None
+            console.print("💾 Reusing cached clustering for this track set")
+        else:
+            cluster_labels = self._fit_clusters(features, available_features, n_clusters)
+            self._store_cached_labels(cache_file, cluster_labels)
+            self._prune_cluster_cache()
         
         # Add cluster labels to dataframe
-        df_clustered = df.loc[feature_data.index].copy()
         df_clustered['cluster'] = cluster_labels
         
         # Analyze clusters
@@ -135,81 +175,188 @@ class MusicAnalyzer:
         console.print(f"✅ Successfully clustered {len(df_clustered)} tracks into {n_clusters} styles")
         return df_clustered, cluster_analysis
     
+    def _load_cached_labels(self, cache_file: str, expected_length: int) -> Optional[np.ndarray]:
+        """
+        Load cached cluster labels, discarding entries that are unreadable or the wrong size.
+        
+        Args:
+            cache_file: Path of the cached .npy file
+            expected_length: Number of tracks the labels must cover
+            
+        Returns:
+            Array of cluster labels, or None when they have to be refit
+        """
+        if not os.path.exists(cache_file):
+            return None
+        
+        try:
+            labels = np.load(cache_file)
+        except (OSError, ValueError, EOFError):
+            labels = None
+        
+        if labels is None or labels.shape != (expected_length,):
+            # Left behind by an interrupted or incompatible run; refit and overwrite it
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+            return None
+        
+        os.utime(cache_file)
+        return labels
+    
+    def _store_cached_labels(self, cache_file: str, labels: np.ndarray):
+        """Write cluster labels through a temporary file so readers never see a partial file."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.save(f, labels)
+        os.replace(tmp_file, cache_file)
+    
+    def _prune_cluster_cache(self):
+        """Delete the least recently used cached label files beyond the cache limit."""
+        cached = [entry for entry in os.scandir(self.cache_dir)
+                  if entry.name.startswith("cluster_") and entry.name.endswith(".npy")]
+        if len(cached) <= self.cache_limit:
+            return
+        
+        cached.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in cached[:len(cached) - self.cache_limit]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # Another run may have removed it already
+    
+    def _cluster_cache_key(self, df: pd.DataFrame, features: np.ndarray,
+                           feature_columns: List[str], n_clusters: int) -> str:
+        """Hash the track IDs, their feature values and the clustering settings."""
+        ids = df['id'].astype(str) if 'id' in df.columns else df['name'].astype(str)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\x1f".join(ids).encode('utf-8'))
+        digest.update(f"|{n_clusters}|{','.join(feature_columns)}|{self.use_pca}|".encode('utf-8'))
+        digest.update(features.tobytes())
+        return digest.hexdigest()
+    
+    def _fit_clusters(self, features: np.ndarray, feature_columns: List[str], n_clusters: int) -> np.ndarray:
+        """
+        Standardize the feature matrix and fit K-means on it.
+        
+        Args:
+            features: float32 feature matrix, one row per track (modified in place)
+            feature_columns: Names of the feature columns
+            n_clusters: Number of clusters to create
+            
+        Returns:
+            Array of cluster labels, one per row
+        """
+        # Normalize features in place (zero-variance columns are left centered)
+        self.feature_mean = features.mean(axis=0)
+        self.feature_std = features.std(axis=0)
+        self.feature_std[self.feature_std == 0] = 1.0
+        features -= self.feature_mean
+        features /= self.feature_std
+        
+        # PCA only pays off for many features; with a handful it just discards information
+        if self.use_pca:
+            # Apply PCA for dimensionality reduction (adjust components based on data size)
+            n_components = min(3, len(features), len(feature_columns))
+            if n_components < 1:
+                n_components = 1
+            
+            # Principal axes straight from the SVD of the standardized data, projected with one float32 matmul
+            _, _, vt = np.linalg.svd(features, full_matrices=False)
+            self.pca_components = vt[:n_components]
+            features = features @ self.pca_components.T
+        
+        # scikit-learn is slow to import, so load it only when a clustering actually has to be fit
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        
+        if len(features) > self.minibatch_threshold:
+            # Large catalogs: mini-batch updates converge in far fewer full passes
+            self.kmeans = MiniBatchKMeans(
+                n_clusters=n_clusters, batch_size=256, n_init=3, random_state=42, reassignment_ratio=0.01
+            )
+        else:
+            # Perform K-means clustering; one k-means++ start is enough for playlist-sized data
+            self.kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto', algorithm='elkan', copy_x=False)
+        return self.kmeans.fit_predict(features)
+    
     def _analyze_clusters(self, df: pd.DataFrame, feature_columns: List[str]) -> Dict[str, Any]:
         """Analyze the characteristics of each cluster using available metadata."""
         console.print("📈 Analyzing cluster characteristics...")
         
+        # One grouping pass; every per-cluster aggregate below is computed for all clusters at once
+        groups = df.groupby('cluster', sort=True)
+        sizes = groups.size()
+        
+        numeric_features = [col for col in feature_columns if col in df.columns and df[col].dtype in ['int64', 'float64']]
+        feature_means = groups[numeric_features].mean() if numeric_features else None
+        avg_popularity = groups['popularity'].mean() if 'popularity' in df.columns else None
+        total_duration_min = groups['duration_ms'].sum() / (1000 * 60) if 'duration_ms' in df.columns else None
+        year_bounds = groups['release_year'].agg(['min', 'max']) if 'release_year' in df.columns else None
+        
+        style_columns = [col for col in ('popularity', 'release_year', 'name_energy', 'duration_ms') if col in df.columns]
+        style_descriptions = self._describe_music_styles(groups[style_columns].mean())
+        
+        sample_tracks = {
+            cluster_id: samples[['name', 'artist']].to_dict('records')
+            for cluster_id, samples in groups.head(3).groupby('cluster', sort=False)
+        }
+        
         analysis = {}
         
-        for cluster_id in sorted(df['cluster'].unique()):
-            cluster_data = df[df['cluster'] == cluster_id]
-            
-            # Calculate mean features for this cluster
-            numeric_features = [col for col in feature_columns if col in cluster_data.columns and cluster_data[col].dtype in ['int64', 'float64']]
-            if numeric_features:
-                feature_means = cluster_data[numeric_features].mean()
-            else:
-                feature_means = pd.Series()
-            
-            # Get style description based on available features
-            style_desc = self._describe_music_style_from_metadata(cluster_data)
-            
+        for cluster_id, style_desc in zip(sizes.index, style_descriptions):
             analysis[cluster_id] = {
-                'size': len(cluster_data),
+                'size': int(sizes.at[cluster_id]),
                 'style_description': style_desc,
-                'avg_features': feature_means.to_dict() if not feature_means.empty else {},
-                'sample_tracks': cluster_data[['name', 'artist']].head(3).to_dict('records'),
-                'avg_popularity': cluster_data['popularity'].mean() if 'popularity' in cluster_data.columns else 0,
-                'total_duration_min': cluster_data['duration_ms'].sum() / (1000 * 60) if 'duration_ms' in cluster_data.columns else 0,
-                'release_year_range': f"{cluster_data['release_year'].min()}-{cluster_data['release_year'].max()}" if 'release_year' in cluster_data.columns else "Unknown"
+                'avg_features': feature_means.loc[cluster_id].to_dict() if feature_means is not None else {},
+                'sample_tracks': sample_tracks[cluster_id],
+                'avg_popularity': avg_popularity.at[cluster_id] if avg_popularity is not None else 0,
+                'total_duration_min': total_duration_min.at[cluster_id] if total_duration_min is not None else 0,
+                'release_year_range': f"{year_bounds.at[cluster_id, 'min']}-{year_bounds.at[cluster_id, 'max']}" if year_bounds is not None else "Unknown"
             }
         
         return analysis
     
-    def _describe_music_style_from_metadata(self, cluster_data: pd.DataFrame) -> str:
-        """Generate a description of music style based on available metadata."""
-        style_elements = []
+    def _describe_music_styles(self, cluster_means: pd.DataFrame) -> List[str]:
+        """
+        Generate music style descriptions for all clusters at once.
+        
+        Args:
+            cluster_means: One row per cluster with the mean of each available metadata column
+            
+        Returns:
+            List of style descriptions, in the row order of cluster_means
+        """
+        n_clusters = len(cluster_means)
+        labels = []  # One array of labels per rule, '' where the rule doesn't apply
         
         # Popularity-based classification
-        avg_popularity = cluster_data['popularity'].mean() if 'popularity' in cluster_data.columns else 50
-        if avg_popularity > 70:
-            style_elements.append("Popular hits")
-        elif avg_popularity < 30:
-            style_elements.append("Deep cuts")
+        if 'popularity' in cluster_means.columns:
+            popularity = cluster_means['popularity'].to_numpy()
+        else:
+            popularity = np.full(n_clusters, 50.0)
+        labels.append(np.where(popularity > 70, "Popular hits", np.where(popularity < 30, "Deep cuts", "")))
         
         # Era-based classification
-        if 'release_year' in cluster_data.columns:
-            avg_year = cluster_data['release_year'].mean()
-            if avg_year < 1980:
-                style_elements.append("Classic oldies")
-            elif avg_year < 1990:
-                style_elements.append("80s")
-            elif avg_year < 2000:
-                style_elements.append("90s")
-            elif avg_year < 2010:
-                style_elements.append("2000s")
-            elif avg_year < 2020:
-                style_elements.append("2010s")
-            else:
-                style_elements.append("Recent releases")
+        if 'release_year' in cluster_means.columns:
+            avg_year = cluster_means['release_year'].to_numpy()
+            labels.append(ERA_LABELS[np.searchsorted(ERA_EDGES, avg_year, side='right')])
         
         # Energy estimation from track names
-        if 'name_energy' in cluster_data.columns:
-            avg_energy = cluster_data['name_energy'].mean()
-            if avg_energy > 0.6:
-                style_elements.append("High-energy")
-            elif avg_energy < 0.4:
-                style_elements.append("Mellow")
+        if 'name_energy' in cluster_means.columns:
+            avg_energy = cluster_means['name_energy'].to_numpy()
+            labels.append(np.where(avg_energy > 0.6, "High-energy", np.where(avg_energy < 0.4, "Mellow", "")))
         
         # Duration-based classification
-        if 'duration_ms' in cluster_data.columns:
-            avg_duration = cluster_data['duration_ms'].mean() / 1000  # Convert to seconds
-            if avg_duration > 300:  # 5 minutes
-                style_elements.append("Extended tracks")
-            elif avg_duration < 180:  # 3 minutes
-                style_elements.append("Radio-friendly")
-        
-        return " ".join(style_elements) if style_elements else "Mixed style"
+        if 'duration_ms' in cluster_means.columns:
+            avg_duration = cluster_means['duration_ms'].to_numpy() / 1000  # Convert to seconds
+            labels.append(np.where(
+                avg_duration > 300, "Extended tracks",  # 5 minutes
+                np.where(avg_duration < 180, "Radio-friendly", "")  # 3 minutes
+            ))
+        
+        return [" ".join(label for label in row if label) or "Mixed style" for row in zip(*labels)]
     
     def display_cluster_overview(self, cluster_analysis: Dict[str, Any]) -> None:
         """Display a rich table overview of clusters."""
@@ -223,7 +370,7 @@ class MusicAnalyzer:
         table.add_column("Sample Tracks", style="white")
         
         for cluster_id, data in cluster_analysis.items():
-            sample_tracks = ", ".join([f"{t['name']} - {t['artist']}" for t in data['sample_tracks']])
+            sample_tracks = _truncated_join(f"{t['name']} - {t['artist']}" for t in data['sample_tracks'])
             
             table.add_row(
                 f"Cluster {cluster_id}",
@@ -232,7 +379,7 @@ class MusicAnalyzer:
                 f"{data['avg_popularity']:.1f}",
                 f"{data['total_duration_min']:.1f}",
                 data.get('release_year_range', 'Unknown'),
-                sample_tracks[:50] + "..." if len(sample_tracks) > 50 else sample_tracks
+                sample_tracks
             )
         
         console.print(table)
@@ -1,17 +1,37 @@
 """Playlist generation and export functionality."""
 
 import os
-import json
+import heapq
+import orjson
+import numpy as np
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Tuple
 from rich.console import Console
 
-console = Console()
+console = Console(highlight=False)
+
+# Per-track templates for the text playlist, built once instead of per iteration
+TXT_TRACK_HEADER = "{i:2d}. {name}\n    Artist: {artist}\n    Album: {album}"
+TXT_FEATURE_ITEM = "%s: %.2f"
+
+# Audio features shown per track in the text playlist, in display order
+TXT_FEATURE_LABELS = (
+    ('danceability', 'Danceability'),
+    ('energy', 'Energy'),
+    ('valence', 'Mood'),
+)
+
+# Audio features averaged in the analysis report
+REPORT_FEATURES = ('danceability', 'energy', 'valence', 'tempo', 'acousticness')
 
 
 class PlaylistGenerator:
     """Generates and exports party playlists."""
     
+    # Output directories already ensured in this process, shared across instances
+    _dir_ready: Set[str] = set()
+    
     def __init__(self):
         """Initialize the playlist generator."""
         self.output_dir = "output"
@@ -19,9 +39,14 @@ class PlaylistGenerator:
     
     def _ensure_output_directory(self):
         """Ensure the output directory exists."""
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        if self.output_dir in PlaylistGenerator._dir_ready:
+            return
+        
+        created = not os.path.isdir(self.output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        if created:
             console.print(f"📁 Created output directory: {self.output_dir}")
+        PlaylistGenerator._dir_ready.add(self.output_dir)
     
     def generate_txt_playlist(self, tracks: List[Dict[str, Any]], filename: str = None) -> str:
         """
@@ -34,50 +59,54 @@ class PlaylistGenerator:
         Returns:
             Path to the generated file
         """
+        now = datetime.now()
         if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             filename = f"wedding_party_playlist_{timestamp}.txt"
         
         filepath = os.path.join(self.output_dir, filename)
         
         console.print(f"📝 Creating text playlist: {filename}")
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("🎵 AI-Generated Wedding Party Playlist 🎵\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total tracks: {len(tracks)}\n")
-            f.write(f"Total duration: {self._calculate_total_duration(tracks):.1f} minutes\n")
-            f.write("=" * 50 + "\n\n")
+        parts: List[str] = []
+        parts.append("🎵 AI-Generated Wedding Party Playlist 🎵\n")
+        parts.append("=" * 50 + "\n")
+        parts.append(f"Generated on: {now.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        parts.append(f"Total tracks: {len(tracks)}\n")
+        parts.append(f"Total duration: {self._calculate_total_duration(tracks):.1f} minutes\n")
+        parts.append("=" * 50 + "\n\n")
+        
+        for i, track in enumerate(tracks, 1):
+            lines = [TXT_TRACK_HEADER.format(
+                i=i, name=track['name'], artist=track['artist'], album=track.get('album', 'Unknown')
+            )]
+            
+            if 'ai_party_score' in track:
+                lines.append(f"    AI Party Score: {track['ai_party_score']}/10")
+                if track.get('ai_reasoning'):
+                    lines.append(f"    AI Reasoning: {track['ai_reasoning']}")
+            
+            if 'cluster' in track:
+                lines.append(f"    Music Style: Cluster {track['cluster']}")
+            
+            # Audio features
+            features = ', '.join([
+                TXT_FEATURE_ITEM % (label, track[key])
+                for key, label in TXT_FEATURE_LABELS
+                if key in track
+            ])
+            if features:
+                lines.append(f"    Features: {features}")
             
-            for i, track in enumerate(tracks, 1):
-                f.write(f"{i:2d}. {track['name']}\n")
-                f.write(f"    Artist: {track['artist']}\n")
-                f.write(f"    Album: {track.get('album', 'Unknown')}\n")
-                
-                if 'ai_party_score' in track:
-                    f.write(f"    AI Party Score: {track['ai_party_score']}/10\n")
-                    f.write(f"    AI Reasoning: {track['ai_reasoning']}\n")
-                
-                if 'cluster' in track:
-                    f.write(f"    Music Style: Cluster {track['cluster']}\n")
-                
-                # Audio features
-                features = []
-                if 'danceability' in track:
-                    features.append(f"Danceability: {track['danceability']:.2f}")
-                if 'energy' in track:
-                    features.append(f"Energy: {track['energy']:.2f}")
-                if 'valence' in track:
-                    features.append(f"Mood: {track['valence']:.2f}")
-                
-                if features:
-                    f.write(f"    Features: {', '.join(features)}\n")
-                
-                if 'external_urls' in track and 'spotify' in track['external_urls']:
-                    f.write(f"    Spotify: {track['external_urls']['spotify']}\n")
-                
-                f.write("\n")
+            spotify_url = track.get('external_urls', {}).get('spotify')
+            if spotify_url:
+                lines.append(f"    Spotify: {spotify_url}")
+            
+            # One append per track keeps the loop body to a single join
+            parts.append("\n".join(lines) + "\n\n")
+        
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(''.join(parts))
         
         console.print(f"✅ Text playlist saved to: {filepath}")
         return filepath
@@ -93,8 +122,9 @@ class PlaylistGenerator:
         Returns:
             Path to the generated file
         """
+        now = datetime.now()
         if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             filename = f"wedding_party_playlist_{timestamp}.json"
         
         filepath = os.path.join(self.output_dir, filename)
@@ -104,19 +134,45 @@ class PlaylistGenerator:
         playlist_data = {
             "metadata": {
                 "name": "AI-Generated Wedding Party Playlist",
-                "generated_on": datetime.now().isoformat(),
+                "generated_on": now.isoformat(),
                 "total_tracks": len(tracks),
                 "total_duration_minutes": self._calculate_total_duration(tracks)
             },
             "tracks": tracks
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(playlist_data, f, indent=2, ensure_ascii=False)
+        # orjson writes UTF-8 directly and handles NumPy scalars left over from the DataFrame
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(
+                playlist_data,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
         
         console.print(f"✅ JSON playlist saved to: {filepath}")
         return filepath
     
+    def generate_all(self, tracks: List[Dict[str, Any]], report_tracks: List[Dict[str, Any]] = None,
+                     cluster_analysis: Dict[str, Any] = None) -> Tuple[str, str, str]:
+        """
+        Write the text playlist, JSON playlist and analysis report.
+        
+        Args:
+            tracks: Playlist tracks for the text and JSON files
+            report_tracks: Tracks to analyze in the report, defaults to the playlist tracks
+            cluster_analysis: Optional cluster analysis data
+        
+        Returns:
+            Paths to the text playlist, JSON playlist and analysis report
+        """
+        # Written one after another: each is a small local file, and their status lines stay in order
+        txt_file = self.generate_txt_playlist(tracks)
+        json_file = self.generate_json_playlist(tracks)
+        report_file = self.generate_analysis_report(
+            tracks if report_tracks is None else report_tracks,
+            cluster_analysis
+        )
+        return txt_file, json_file, report_file
+    
     def create_spotify_playlist(self, spotify_client, tracks: List[Dict[str, Any]], 
                               name: str = None, description: str = None) -> Dict[str, Any]:
         """
@@ -131,21 +187,25 @@ class PlaylistGenerator:
         Returns:
             Playlist information
         """
+        now = datetime.now()
         if not name:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+            timestamp = now.strftime("%Y-%m-%d %H:%M")
             name = f"🎉 Wedding Party Playlist ({timestamp})"
         
+        # Extract track URIs and count AI-validated tracks in the same pass
+        ai_count = 0
+        track_uris = []
+        for track in tracks:
+            if track.get('ai_party_score', 0) >= 6:
+                ai_count += 1
+            track_id = track.get('id')
+            if track_id:
+                track_uris.append("spotify:track:" + track_id)
+        
         if not description:
-            ai_count = sum(1 for t in tracks if t.get('ai_party_score', 0) >= 6)
             description = (f"AI-curated wedding party playlist with {len(tracks)} tracks. "
                          f"{ai_count} tracks validated by AI for optimal party atmosphere. "
-                         f"Generated on {datetime.now().strftime('%Y-%m-%d')}")
-        
-        # Extract track URIs
-        track_uris = []
-        for track in tracks:
-            if 'id' in track:
-                track_uris.append(f"spotify:track:{track['id']}")
+                         f"Generated on {now.strftime('%Y-%m-%d')}")
         
         if not track_uris:
             raise ValueError("No valid Spotify track IDs found")
@@ -156,8 +216,10 @@ class PlaylistGenerator:
     
     def _calculate_total_duration(self, tracks: List[Dict[str, Any]]) -> float:
         """Calculate total duration of tracks in minutes."""
-        total_ms = sum(track.get('duration_ms', 0) for track in tracks)
-        return total_ms / (1000 * 60)  # Convert to minutes
+        total_ms = np.fromiter(
+            (track.get('duration_ms', 0) for track in tracks), dtype=np.float64, count=len(tracks)
+        ).sum()
+        return float(total_ms) / (1000 * 60)  # Convert to minutes
     
     def generate_analysis_report(self, tracks: List[Dict[str, Any]], 
                                cluster_analysis: Dict[str, Any] = None) -> str:
@@ -171,79 +233,92 @@ class PlaylistGenerator:
         Returns:
             Path to the generated report
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         filename = f"playlist_analysis_report_{timestamp}.txt"
         filepath = os.path.join(self.output_dir, filename)
         
         console.print(f"📊 Creating analysis report: {filename}")
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("🎵 Wedding Playlist Analysis Report 🎵\n")
-            f.write("=" * 60 + "\n")
-            f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        # Gather every aggregate the report needs in a single pass over the tracks
+        total_ms = 0
+        ai_scores = []
+        recommendations = Counter()
+        feature_rows = []
+        for track in tracks:
+            total_ms += track.get('duration_ms', 0)
+            recommendations[track.get('ai_recommendation', 'unknown')] += 1
+            if 'ai_party_score' in track:
+                ai_scores.append(track['ai_party_score'])
+            feature_rows.append([track.get(feature, np.nan) for feature in REPORT_FEATURES])
+        
+        # Missing features are NaN so the per-feature means run as one vectorized reduction
+        feature_matrix = np.array(feature_rows, dtype=np.float32).reshape(-1, len(REPORT_FEATURES))
+        feature_counts = (~np.isnan(feature_matrix)).sum(axis=0)
+        feature_sums = np.nansum(feature_matrix, axis=0, dtype=np.float64)
+        
+        parts: List[str] = []
+        parts.append("🎵 Wedding Playlist Analysis Report 🎵\n")
+        parts.append("=" * 60 + "\n")
+        parts.append(f"Generated on: {now.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        
+        # Overall statistics
+        parts.append("📈 OVERALL STATISTICS\n")
+        parts.append("-" * 30 + "\n")
+        parts.append(f"Total tracks analyzed: {len(tracks)}\n")
+        parts.append(f"Total duration: {total_ms / (1000 * 60):.1f} minutes\n")
+        
+        if ai_scores:
+            avg_ai_score = sum(ai_scores) / len(ai_scores)
+            high_score_count = sum(1 for score in ai_scores if score >= 7)
             
-            # Overall statistics
-            f.write("📈 OVERALL STATISTICS\n")
-            f.write("-" * 30 + "\n")
-            f.write(f"Total tracks analyzed: {len(tracks)}\n")
-            f.write(f"Total duration: {self._calculate_total_duration(tracks):.1f} minutes\n")
+            parts.append(f"Average AI party score: {avg_ai_score:.1f}/10\n")
+            parts.append(f"High-scoring tracks (7+): {high_score_count}\n")
             
-            if any('ai_party_score' in track for track in tracks):
-                ai_scores = [track.get('ai_party_score', 0) for track in tracks if 'ai_party_score' in track]
-                avg_ai_score = sum(ai_scores) / len(ai_scores) if ai_scores else 0
-                high_score_count = sum(1 for score in ai_scores if score >= 7)
-                
-                f.write(f"Average AI party score: {avg_ai_score:.1f}/10\n")
-                f.write(f"High-scoring tracks (7+): {high_score_count}\n")
-                
-                # AI recommendations breakdown
-                recommendations = {}
-                for track in tracks:
-                    rec = track.get('ai_recommendation', 'unknown')
-                    recommendations[rec] = recommendations.get(rec, 0) + 1
-                
-                f.write("\nAI Recommendations breakdown:\n")
-                for rec, count in recommendations.items():
-                    f.write(f"  {rec.upper()}: {count} tracks\n")
+            # AI recommendations breakdown
+            parts.append("\nAI Recommendations breakdown:\n")
+            for rec, count in recommendations.items():
+                parts.append(f"  {rec.upper()}: {count} tracks\n")
+        
+        # Audio features analysis (shown when any track has danceability, the first report feature)
+        if feature_counts[0]:
+            parts.append("\n🎶 AUDIO FEATURES ANALYSIS\n")
+            parts.append("-" * 30 + "\n")
             
-            # Audio features analysis
-            if any('danceability' in track for track in tracks):
-                f.write("\n🎶 AUDIO FEATURES ANALYSIS\n")
-                f.write("-" * 30 + "\n")
-                
-                features = ['danceability', 'energy', 'valence', 'tempo', 'acousticness']
-                for feature in features:
-                    values = [track.get(feature, 0) for track in tracks if feature in track]
-                    if values:
-                        avg_value = sum(values) / len(values)
-                        if feature == 'tempo':
-                            f.write(f"Average {feature}: {avg_value:.0f} BPM\n")
-                        else:
-                            f.write(f"Average {feature}: {avg_value:.2f}\n")
+            for feature, total, count in zip(REPORT_FEATURES, feature_sums, feature_counts):
+                if count:
+                    avg_value = total / count
+                    if feature == 'tempo':
+                        parts.append(f"Average {feature}: {avg_value:.0f} BPM\n")
+                    else:
+                        parts.append(f"Average {feature}: {avg_value:.2f}\n")
+        
+        # Cluster analysis
+        if cluster_analysis:
+            parts.append("\n🎯 MUSIC STYLE CLUSTERS\n")
+            parts.append("-" * 30 + "\n")
             
-            # Cluster analysis
-            if cluster_analysis:
-                f.write("\n🎯 MUSIC STYLE CLUSTERS\n")
-                f.write("-" * 30 + "\n")
-                
-                for cluster_id, data in cluster_analysis.items():
-                    f.write(f"\nCluster {cluster_id}: {data['style_description']}\n")
-                    f.write(f"  Tracks: {data['size']}\n")
-                    f.write(f"  Duration: {data['total_duration_min']:.1f} minutes\n")
-                    f.write(f"  Avg Popularity: {data['avg_popularity']:.1f}/100\n")
-                    f.write("  Sample tracks:\n")
-                    for track in data['sample_tracks']:
-                        f.write(f"    - {track['name']} by {track['artist']}\n")
+            for cluster_id, data in cluster_analysis.items():
+                parts.append(f"\nCluster {cluster_id}: {data['style_description']}\n")
+                parts.append(f"  Tracks: {data['size']}\n")
+                parts.append(f"  Duration: {data['total_duration_min']:.1f} minutes\n")
+                parts.append(f"  Avg Popularity: {data['avg_popularity']:.1f}/100\n")
+                parts.append("  Sample tracks:\n")
+                for track in data['sample_tracks']:
+                    parts.append(f"    - {track['name']} by {track['artist']}\n")
+        
+        # Top recommended tracks
+        if ai_scores:
+            parts.append("\n🏆 TOP AI-RECOMMENDED TRACKS\n")
+            parts.append("-" * 30 + "\n")
             
-            # Top recommended tracks
-            if any('ai_party_score' in track for track in tracks):
-                f.write("\n🏆 TOP AI-RECOMMENDED TRACKS\n")
-                f.write("-" * 30 + "\n")
-                
-                top_tracks = sorted(tracks, key=lambda x: x.get('ai_party_score', 0), reverse=True)[:10]
-                for i, track in enumerate(top_tracks, 1):
-                    score = track.get('ai_party_score', 0)
-                    f.write(f"{i:2d}. {track['name']} - {track['artist']} (Score: {score}/10)\n")
+            top_tracks = heapq.nlargest(10, tracks, key=lambda x: x.get('ai_party_score', 0))
+            for i, track in enumerate(top_tracks, 1):
+                score = track.get('ai_party_score', 0)
+                parts.append(f"{i:2d}. {track['name']} - {track['artist']} (Score: {score}/10)\n")
+        
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(''.join(parts))
         
         console.print(f"✅ Analysis report saved to: {filepath}")
         return filepath 
\ No newline at end of file
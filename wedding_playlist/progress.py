@@ -0,0 +1,72 @@
+"""Progress reporting that degrades gracefully outside a terminal."""
+
+from typing import Any, Dict
+from rich.console import Console
+from rich.progress import Progress
+
+
+class PlainProgress:
+    """Minimal stand-in for rich Progress that prints a few counter lines."""
+    
+    def __init__(self, console: Console, steps: int = 10):
+        """
+        Initialize the counter.
+        
+        Args:
+            console: Console to print progress lines to
+            steps: Roughly how many lines to print per task
+        """
+        self.console = console
+        self.steps = steps
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+    
+    def __enter__(self) -> "PlainProgress":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+    
+    def add_task(self, description: str, total: float = 100) -> int:
+        """Register a task and return its ID."""
+        task_id = len(self.tasks)
+        self.tasks[task_id] = {
+            'description': description,
+            'total': total,
+            'completed': 0,
+            'next_report': total / self.steps
+        }
+        return task_id
+    
+    def update(self, task_id: int, advance: float = 0, description: str = None) -> None:
+        """Advance a task, printing only when an advance crosses the next reporting step."""
+        task = self.tasks[task_id]
+        if description is not None:
+            task['description'] = description
+        if advance <= 0:
+            return
+        
+        previous = task['completed']
+        task['completed'] += advance
+        
+        finished_now = previous < task['total'] <= task['completed']
+        if task['completed'] >= task['next_report'] or finished_now:
+            self.console.print(f"{task['description']} {task['completed']:.0f}/{task['total']:.0f}")
+            while task['next_report'] <= task['completed']:
+                task['next_report'] += max(task['total'] / self.steps, 1)
+    
+    def advance(self, task_id: int, advance: float = 1) -> None:
+        """Advance a task by the given amount."""
+        self.update(task_id, advance=advance)
+
+
+def create_progress(console: Console, **kwargs):
+    """
+    Return a rich Progress on a terminal, otherwise a lightweight counter.
+    
+    Args:
+        console: Console to render progress on
+        **kwargs: Extra options for rich Progress (e.g. refresh_per_second, disable)
+    """
+    if console.is_terminal or kwargs.get('disable'):
+        return Progress(console=console, **kwargs)
+    return PlainProgress(console)
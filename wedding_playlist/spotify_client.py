@@ -2,10 +2,15 @@
 
 import os
 import time
+import asyncio
+import sqlite3
+import orjson
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.exceptions import SpotifyException
 from typing import List, Dict, Any
 from rich.console import Console
+from .progress import create_progress
 
 # Ensure environment variables are loaded
 try:
@@ -14,14 +19,45 @@ try:
 except ImportError:
     pass  # dotenv not available, assume env vars are set manually
 
-console = Console()
+console = Console(highlight=False)
+
+
+def _is_valid_track_id(track_id: Any) -> bool:
+    """Spotify track IDs are 22-character base62 strings."""
+    return isinstance(track_id, str) and len(track_id) == 22
+
+
+def _make_track(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the track dictionary used throughout the pipeline from a Spotify track object."""
+    album = item['album']
+    return {
+        'id': item['id'],
+        'name': item['name'],
+        'artist': ', '.join([artist['name'] for artist in item['artists']]),
+        'album': {
+            'name': album['name'],
+            'release_date': album.get('release_date', ''),
+            'total_tracks': album.get('total_tracks', 0)
+        },
+        'popularity': item['popularity'],
+        'preview_url': item['preview_url'],
+        'external_urls': item['external_urls'],
+        'duration_ms': item['duration_ms'],
+        'explicit': item.get('explicit', False),
+        'track_number': item.get('track_number', 0)
+    }
 
 
 class SpotifyClient:
     """Client for interacting with Spotify Web API."""
     
-    def __init__(self):
-        """Initialize Spotify client with OAuth."""
+    def __init__(self, verbose: bool = False):
+        """
+        Initialize Spotify client with OAuth.
+        
+        Args:
+            verbose: Print per-batch and per-track progress while fetching audio features
+        """
         self.client_id = os.getenv('SPOTIFY_CLIENT_ID')
         self.client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
         self.redirect_uri = os.getenv('SPOTIFY_REDIRECT_URI', 'https://127.0.0.1:8888/callback')
@@ -41,6 +77,15 @@ class SpotifyClient:
             redirect_uri=self.redirect_uri,
             scope=scope
         ))
+        
+        # Per-batch detail is only rendered when asked for; rich markup is costly in hot loops
+        self.verbose = verbose
+        self._log = console.print if verbose else (lambda *args, **kwargs: None)
+        
+        # Audio features never change for a track ID, so cache them indefinitely
+        # (opened on first use, so commands that never fetch features don't create it)
+        self.cache_path = "output/audio_features_cache.sqlite"
+        self._cache = None
     
     def get_user_top_tracks(self, limit: int = 50, time_range: str = 'medium_term') -> List[Dict[str, Any]]:
         """
@@ -53,36 +98,30 @@ class SpotifyClient:
         console.print(f"🎵 Fetching top {limit} tracks from Spotify...")
         
         results = self.sp.current_user_top_tracks(limit=limit, time_range=time_range)
-        tracks = []
-        
-        for item in results['items']:
-            track_info = {
-                'id': item['id'],
-                'name': item['name'],
-                'artist': ', '.join([artist['name'] for artist in item['artists']]),
-                'album': {
-                    'name': item['album']['name'],
-                    'release_date': item['album'].get('release_date', ''),
-                    'total_tracks': item['album'].get('total_tracks', 0)
-                },
-                'popularity': item['popularity'],
-                'preview_url': item['preview_url'],
-                'external_urls': item['external_urls'],
-                'duration_ms': item['duration_ms'],
-                'explicit': item.get('explicit', False),
-                'track_number': item.get('track_number', 0)
-            }
-            tracks.append(track_info)
+        tracks = [_make_track(item) for item in results['items']]
         
         console.print(f"✅ Successfully fetched {len(tracks)} tracks")
         return tracks
     
     def get_audio_features(self, track_ids: List[str]) -> List[Dict[str, Any]]:
         """Get audio features for a list of track IDs."""
+        return asyncio.run(self.get_audio_features_async(track_ids))
+    
+    async def get_audio_features_async(self, track_ids: List[str], max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """
+        Get audio features for a list of track IDs, fetching batches concurrently.
+        
+        Args:
+            track_ids: Spotify track IDs
+            max_concurrency: Maximum number of batch requests in flight at once
+            
+        Returns:
+            List of audio feature dictionaries, in track ID order
+        """
         console.print(f"🔊 Analyzing audio features for {len(track_ids)} tracks...")
         
         # Remove duplicates and filter out None/empty IDs
-        unique_track_ids = list(dict.fromkeys([tid for tid in track_ids if tid and isinstance(tid, str) and len(tid) == 22]))
+        unique_track_ids = list(dict.fromkeys(filter(_is_valid_track_id, track_ids)))
         console.print(f"📊 Processing {len(unique_track_ids)} unique valid track IDs...")
         
         if not unique_track_ids:
@@ -90,47 +129,133 @@ class SpotifyClient:
             return []
         
         # Debug: show first few track IDs
-        console.print(f"🔍 Sample track IDs: {unique_track_ids[:3]}")
+        self._log(f"🔍 Sample track IDs: {unique_track_ids[:3]}")
+        
+        cached = self._load_cached_features(unique_track_ids)
+        missing_ids = [tid for tid in unique_track_ids if tid not in cached]
+        if cached:
+            console.print(f"💾 {len(cached)} audio features loaded from cache, {len(missing_ids)} to fetch")
         
         # Use smaller batch size to avoid URL length issues and rate limiting
         batch_size = 50
-        all_features = []
+        batches = [missing_ids[i:i+batch_size] for i in range(0, len(missing_ids), batch_size)]
         
-        for i in range(0, len(unique_track_ids), batch_size):
-            batch = unique_track_ids[i:i+batch_size]
-            console.print(f"🔄 Processing batch {i//batch_size + 1}/{(len(unique_track_ids) + batch_size - 1)//batch_size} ({len(batch)} tracks)")
+        # spotipy is blocking, so each batch runs in a worker thread; the semaphore caps the request rate
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        with create_progress(console, disable=not batches) as progress:
+            task = progress.add_task("Fetching audio features...", total=len(missing_ids))
+            
+            async def fetch(batch_number: int, batch: List[str]) -> List[Dict[str, Any]]:
+                async with semaphore:
+                    features = await asyncio.to_thread(
+                        self._fetch_audio_features_batch, batch, batch_number, len(batches)
+                    )
+                progress.advance(task, len(batch))
+                return features
             
+            results = await asyncio.gather(*(fetch(i, batch) for i, batch in enumerate(batches, 1)))
+        fetched = [feature for batch_features in results for feature in batch_features]
+        self._store_cached_features(fetched)
+        
+        cached.update((feature['id'], feature) for feature in fetched)
+        all_features = [cached[tid] for tid in unique_track_ids if tid in cached]
+        
+        console.print(f"✅ Retrieved audio features for {len(all_features)} tracks total")
+        return all_features
+    
+    def _features_cache(self) -> sqlite3.Connection:
+        """Open the audio feature cache database, creating it on first use."""
+        if self._cache is None:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            self._cache = sqlite3.connect(self.cache_path)
+            self._cache.execute(
+                "CREATE TABLE IF NOT EXISTS audio_features "
+                "(id TEXT PRIMARY KEY, payload BLOB)"
+            )
+            self._cache.commit()
+        return self._cache
+    
+    def _load_cached_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return cached audio features keyed by track ID for the IDs that have them."""
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(track_ids), 500):
+            chunk = track_ids[i:i+500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._features_cache().execute(
+                f"SELECT id, payload FROM audio_features WHERE id IN ({placeholders})", chunk
+            )
+            found.update((track_id, orjson.loads(payload)) for track_id, payload in rows)
+        return found
+    
+    def _store_cached_features(self, features: List[Dict[str, Any]]):
+        """Persist freshly fetched audio features."""
+        if features:
+            cache = self._features_cache()
+            cache.executemany(
+                "INSERT OR REPLACE INTO audio_features (id, payload) VALUES (?, ?)",
+                [(feature['id'], orjson.dumps(feature)) for feature in features]
+            )
+            cache.commit()
+    
+    def _fetch_audio_features_batch(self, batch: List[str], batch_number: int, total_batches: int,
+                                    max_rate_limit_retries: int = 3) -> List[Dict[str, Any]]:
+        """Fetch one batch of audio features, falling back to single-track requests on error."""
+        self._log(f"🔄 Processing batch {batch_number}/{total_batches} ({len(batch)} tracks)")
+        
+        for attempt in range(max_rate_limit_retries + 1):
             try:
                 features = self.sp.audio_features(batch)
                 valid_features = [f for f in features if f is not None]
-                all_features.extend(valid_features)
-                console.print(f"✅ Retrieved {len(valid_features)} audio features from batch")
+                self._log(f"✅ Retrieved {len(valid_features)} audio features from batch")
+                return valid_features
                 
-                # Small delay to avoid rate limiting
-                time.sleep(0.1)
+            except SpotifyException as e:
+                # Back off and retry the whole batch on 429 instead of fanning out into single-track calls
+                if e.http_status != 429 or attempt == max_rate_limit_retries:
+                    return self._fetch_audio_features_individually(batch, e)
+                retry_after = self._retry_after_seconds(e, attempt)
+                console.print(f"⏳ Rate limited on batch {batch_number}, retrying in {retry_after:.0f}s")
+                time.sleep(retry_after)
                 
             except Exception as e:
-                console.print(f"⚠️ Error processing batch: {e}")
-                console.print(f"📝 Batch track IDs: {batch[:5]}{'...' if len(batch) > 5 else ''}")
-                
-                # Try processing tracks one by one to identify problematic ones
-                console.print("🔧 Trying individual track processing...")
-                for track_id in batch:
-                    try:
-                        feature = self.sp.audio_features([track_id])
-                        if feature and feature[0]:
-                            all_features.append(feature[0])
-                            console.print(f"✅ Processed track: {track_id}")
-                        else:
-                            console.print(f"⚠️ No features for track: {track_id}")
-                    except Exception as track_error:
-                        console.print(f"❌ Failed track {track_id}: {track_error}")
-                    
-                    # Small delay between individual requests
-                    time.sleep(0.05)
+                return self._fetch_audio_features_individually(batch, e)
         
-        console.print(f"✅ Retrieved audio features for {len(all_features)} tracks total")
-        return all_features
+        return []
+    
+    @staticmethod
+    def _retry_after_seconds(error: SpotifyException, attempt: int) -> float:
+        """Seconds to wait after a 429, preferring Spotify's Retry-After header over exponential backoff."""
+        headers = error.headers or {}
+        try:
+            return float(headers.get('Retry-After', headers.get('retry-after')))
+        except (TypeError, ValueError):
+            return float(2 ** attempt)
+    
+    def _fetch_audio_features_individually(self, batch: List[str], error: Exception) -> List[Dict[str, Any]]:
+        """Fetch audio features one track at a time to skip past problematic IDs in a failed batch."""
+        console.print(f"⚠️ Error processing batch: {error}")
+        self._log(f"📝 Batch track IDs: {batch[:5]}{'...' if len(batch) > 5 else ''}")
+        
+        # Try processing tracks one by one to identify problematic ones
+        self._log("🔧 Trying individual track processing...")
+        batch_features = []
+        for track_id in batch:
+            try:
+                feature = self.sp.audio_features([track_id])
+                if feature and feature[0]:
+                    batch_features.append(feature[0])
+                    self._log(f"✅ Processed track: {track_id}")
+                else:
+                    self._log(f"⚠️ No features for track: {track_id}")
+            except Exception as track_error:
+                console.print(f"❌ Failed track {track_id}: {track_error}")
+            
+            # Small delay between individual requests
+            time.sleep(0.05)
+        
+        return batch_features
     
     def get_saved_tracks(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get user's saved tracks (liked songs)."""
@@ -146,25 +271,7 @@ class SpotifyClient:
             if not results['items']:
                 break
             
-            for item in results['items']:
-                track = item['track']
-                track_info = {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                    'album': {
-                        'name': track['album']['name'],
-                        'release_date': track['album'].get('release_date', ''),
-                        'total_tracks': track['album'].get('total_tracks', 0)
-                    },
-                    'popularity': track['popularity'],
-                    'preview_url': track['preview_url'],
-                    'external_urls': track['external_urls'],
-                    'duration_ms': track['duration_ms'],
-                    'explicit': track.get('explicit', False),
-                    'track_number': track.get('track_number', 0)
-                }
-                tracks.append(track_info)
+            tracks.extend(_make_track(item['track']) for item in results['items'])
             
             offset += batch_size
         